@@ -149,6 +149,9 @@ class Match(BaseModel):
 
 
 class MatchDocument(Match, Document):
+    # Content hash of the uploaded screenshot, stored by bot.ingestion.artifacts
+    screenshot: str | None = None
+
     class Settings:
         name = "matches"
         indexes = [
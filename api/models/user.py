@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Literal
 
 from beanie import Document
 from pydantic import Field
@@ -10,6 +11,9 @@ class User(Document):
     discord_id: int = Field(..., description="The Discord user ID")
     summoner: str = Field(..., description="The summoner name")
     tag: str = Field(default="EUW", description="The region tag")
+    main_role: Literal["top", "jungle", "mid", "bottom", "support"] | None = Field(
+        default=None, description="The role the user plays best, teams are drawn to cover every role"
+    )
     creation_date: datetime = Field(default_factory=datetime.utcnow)
     last_modified: datetime = Field(default_factory=datetime.utcnow)
 
@@ -0,0 +1,211 @@
+from functools import lru_cache
+from itertools import combinations
+
+import numpy as np
+
+from bot.consts import roles
+
+team_size = 5
+# What a split costs, each term the lower the better:
+# rank: points between the teams beyond the tolerance, roles: main roles taken twice in a team,
+# win_rate: difference between the teams' summed recent win rates, repeats: teammates of the last game together again
+terms = ("rank", "roles", "win_rate", "repeats")
+
+
+@lru_cache
+def team_splits(players: int = 2 * team_size) -> np.ndarray:
+    """
+    Every way to split `players` into two teams, as a boolean mask of the first team per row. The first player is
+    always in the first team, so each split appears once and not again with the teams swapped: 126 rows for ten.
+    """
+    first_teams = [(0, *others) for others in combinations(range(1, players), players // 2 - 1)]
+    masks = np.zeros((len(first_teams), players), dtype=bool)
+    masks[np.repeat(np.arange(len(first_teams)), players // 2), np.concatenate(first_teams)] = True
+    masks.flags.writeable = False
+    return masks
+
+
+def score_gaps(scores: np.ndarray) -> np.ndarray:
+    # Absolute score difference between the two teams of every split
+    first_team = team_splits(len(scores)) @ scores
+    return np.abs(2 * first_team - scores.sum())
+
+
+def split_terms(
+    scores: np.ndarray,
+    tolerance: float = 0,
+    main_roles: list[str | None] | None = None,
+    win_rates: list[float] | None = None,
+    last_teams: list[int | None] | None = None,
+) -> np.ndarray:
+    """
+    The cost of every split on each of `terms`, one row per split. `last_teams` tells which team each player was in
+    last game, None for those who did not play it. Terms without their data cost nothing.
+    """
+    masks = team_splits(len(scores))
+    teams = np.stack([masks, ~masks]).astype(float)
+    costs = np.zeros((len(masks), len(terms)))
+    costs[:, 0] = np.maximum(score_gaps(scores) - tolerance, 0)
+    if main_roles is not None:
+        role_players = np.array([[role == _role for _role in roles] for role in main_roles], dtype=float)
+        # Players taking each role in each team, those without a main role take whichever is left
+        costs[:, 1] = np.maximum(teams @ role_players - 1, 0).sum(axis=(0, 2))
+    if win_rates is not None:
+        costs[:, 2] = np.abs(np.subtract(*(teams @ np.asarray(win_rates, dtype=float))))
+    if last_teams is not None:
+        last = np.array([-1 if team is None else team for team in last_teams])
+        teammates = (last[:, None] == last[None, :]) & (last[:, None] >= 0)
+        np.fill_diagonal(teammates, False)
+        # Pairs of last game's teammates in the same team again, over both teams
+        costs[:, 3] = np.einsum("tsi,ij,tsj->s", teams, teammates.astype(float), teams) / 2
+    return costs
+
+
+def pareto_front(costs: np.ndarray) -> np.ndarray:
+    """
+    Rows no other row beats, that is as good on every term and better on one
+    """
+    as_good = (costs[None, :, :] <= costs[:, None, :]).all(axis=2)
+    better = (costs[None, :, :] < costs[:, None, :]).any(axis=2)
+    # dominated[i] when some row j is as good as row i everywhere and better somewhere
+    dominated = (as_good & better).any(axis=1)
+    return np.flatnonzero(~dominated)
+
+
+def solve(
+    scores: list[float] | np.ndarray,
+    tolerance: float = 0,
+    rng: np.random.Generator | None = None,
+    weights: dict[str, float] | None = None,
+    main_roles: list[str | None] | None = None,
+    win_rates: list[float] | None = None,
+    last_teams: list[int | None] | None = None,
+) -> tuple[list[int], list[int], float]:
+    """
+    Indices of the players in each team, and the score gap between them. The split is drawn at random among the
+    cheapest of the Pareto front, by the sum of their terms times `weights`. With the default weights only the score gap
+    counts: any split within `tolerance` can be drawn, or one of the closest ones when none is that close.
+    """
+    scores = np.asarray(scores, dtype=float)
+    costs = split_terms(scores, tolerance, main_roles, win_rates, last_teams)
+    weights = weights or {"rank": 1}
+    front = pareto_front(costs)
+    weighted = costs[front] @ np.array([weights.get(term, 0) for term in terms], dtype=float)
+    rng = rng or np.random.default_rng()
+    split = rng.choice(front[np.isclose(weighted, weighted.min())])
+    # Either team can be the blue one
+    first_team, second_team = team_splits(len(scores))[split], ~team_splits(len(scores))[split]
+    if rng.random() < 0.5:
+        first_team, second_team = second_team, first_team
+    return np.flatnonzero(first_team).tolist(), np.flatnonzero(second_team).tolist(), float(score_gaps(scores)[split])
+
+
+def matchup_costs(first: tuple[np.ndarray, ...], second: tuple[np.ndarray, ...], tolerance: float) -> np.ndarray:
+    """
+    The `terms` of matches between the teams in `first` and those in `second`, each given by its totals: score,
+    win rate, players per role and pairs of last game's teammates
+    """
+    first_scores, first_win_rates, first_roles, first_pairs = first
+    second_scores, second_win_rates, second_roles, second_pairs = second
+    return np.stack(
+        [
+            np.maximum(np.abs(first_scores - second_scores) - tolerance, 0),
+            np.maximum(first_roles - 1, 0).sum(axis=-1) + np.maximum(second_roles - 1, 0).sum(axis=-1),
+            np.abs(first_win_rates - second_win_rates),
+            first_pairs + second_pairs,
+        ],
+        axis=-1,
+    )
+
+
+def partition(
+    scores: list[float] | np.ndarray,
+    tolerance: float = 0,
+    rng: np.random.Generator | None = None,
+    weights: dict[str, float] | None = None,
+    main_roles: list[str | None] | None = None,
+    win_rates: list[float] | None = None,
+    last_teams: list[int | None] | None = None,
+    max_swaps: int = 1000,
+) -> list[tuple[list[int], list[int], float]]:
+    """
+    Split the players, a multiple of ten of them, into lobbies, each as `solve` returns it. Teams are seeded with a
+    snake draft by score, so every lobby gets strong and weak players alike. Then, while one does, the swap of two
+    players that lowers the weighted `terms` of all lobbies the most is made. Each lobby is finally split by `solve`,
+    exact over its ten players.
+    """
+    scores = np.asarray(scores, dtype=float)
+    players = len(scores)
+    if not players or players % (2 * team_size):
+        raise ValueError(f"Cannot split {players} players into lobbies of {2 * team_size}")
+    rng = rng or np.random.default_rng()
+    weight = np.array([(weights or {"rank": 1}).get(term, 0) for term in terms], dtype=float)
+    teams = players // team_size
+
+    player_win_rates = np.zeros(players) if win_rates is None else np.asarray(win_rates, dtype=float)
+    player_roles = np.array([[role == _role for _role in roles] for role in main_roles or [None] * players], float)
+    last = np.array([-1 if team is None else team for team in last_teams or [None] * players])
+    teammates = ((last[:, None] == last[None, :]) & (last[:, None] >= 0)).astype(float)
+    np.fill_diagonal(teammates, 0)
+
+    # Snake draft, strongest first and ties in random order: teams 0, 1, ..., n - 1, n - 1, ..., 1, 0, 0, 1, ...
+    # Teams 2i and 2i + 1 play each other
+    order = np.lexsort((rng.random(players), -scores))
+    picks = np.arange(players) % teams
+    team_of = np.empty(players, dtype=int)
+    team_of[order] = np.where(np.arange(players) // teams % 2, teams - 1 - picks, picks)
+
+    first, second = np.triu_indices(players, 1)
+    for _ in range(max_swaps):
+        members = np.eye(teams)[team_of].T
+        # Last game's teammates each player has in each team
+        known = teammates @ members.T
+        totals = (members @ scores, members @ player_win_rates, members @ player_roles, (known * members.T).sum(0) / 2)
+        lobby_costs = matchup_costs(*(tuple(total[side::2] for total in totals) for side in (0, 1)), tolerance) @ weight
+
+        # Every swap of two players of different teams, a from team_a and b from team_b
+        swaps = team_of[first] != team_of[second]
+        a, b = first[swaps], second[swaps]
+        team_a, team_b = team_of[a], team_of[b]
+        swapped_a = (
+            totals[0][team_a] - scores[a] + scores[b],
+            totals[1][team_a] - player_win_rates[a] + player_win_rates[b],
+            totals[2][team_a] - player_roles[a] + player_roles[b],
+            totals[3][team_a] - known[a, team_a] + known[b, team_a] - teammates[a, b],
+        )
+        swapped_b = (
+            totals[0][team_b] - scores[b] + scores[a],
+            totals[1][team_b] - player_win_rates[b] + player_win_rates[a],
+            totals[2][team_b] - player_roles[b] + player_roles[a],
+            totals[3][team_b] - known[b, team_b] + known[a, team_b] - teammates[a, b],
+        )
+        opponents_a, opponents_b = (tuple(total[team ^ 1] for total in totals) for team in (team_a, team_b))
+        change = np.where(
+            team_b == team_a ^ 1,
+            matchup_costs(swapped_a, swapped_b, tolerance) @ weight - lobby_costs[team_a // 2],
+            matchup_costs(swapped_a, opponents_a, tolerance) @ weight
+            + matchup_costs(swapped_b, opponents_b, tolerance) @ weight
+            - lobby_costs[team_a // 2]
+            - lobby_costs[team_b // 2],
+        )
+        best = np.argmin(change)
+        if change[best] > -1e-9:
+            break
+        team_of[a[best]], team_of[b[best]] = team_b[best], team_a[best]
+
+    lobbies = []
+    for lobby in range(teams // 2):
+        indices = np.flatnonzero(team_of // 2 == lobby)
+        first_team, second_team, gap = solve(
+            scores[indices],
+            tolerance,
+            rng,
+            weights,
+            None if main_roles is None else [main_roles[index] for index in indices],
+            None if win_rates is None else [win_rates[index] for index in indices],
+            None if last_teams is None else [last_teams[index] for index in indices],
+        )
+        lobbies.append(
+            ([int(indices[index]) for index in first_team], [int(indices[index]) for index in second_team], gap)
+        )
+    return lobbies
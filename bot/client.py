@@ -1,5 +1,8 @@
+from asyncio import create_task, to_thread
 from dataclasses import dataclass
+from importlib import import_module
 from json import loads
+from logging import getLogger
 from typing import Any
 
 from aioredis import Redis
@@ -11,21 +14,49 @@ from api.models.league import StandingsDocument
 from api.models.match import MatchDocument, Player
 from api.models.user import User
 from bot.commands import ClientSingleton
-from bot.commands.account import Register
+from bot.commands.account import Register, Role
 from bot.commands.generic import Help
-from bot.commands.match import Close, Play, Playlist, Remove, Reset, Upload
+from bot.commands.match import Close, Play, Playlist, Remove, Reset, Upload, Weights
 from bot.commands.post_match import ForceVote, MVPList, ShowMissing, Vote
+from bot.consts import ingestion_warm_up, ocr_warm_up
+from bot.startup import import_timed, startup_report, timed
 from clients.redis import retrieve_async_redis_client
 
+logger = getLogger("discord.client")
+
+# What the first upload imports, heaviest dependencies first so the report shows each one's own cost
+ingestion_modules = (
+    "numpy",
+    "cv2",
+    "google.generativeai",
+    "bot.ingestion.upload",
+    "bot.ingestion.local",
+    "bot.ingestion.artifacts",
+    "bot.ingestion.gemini",
+    "bot.ingestion.worker",
+)
+
+
+def warm_up_ocr() -> None:
+    # OCR dependencies are optional, only import them (off the event loop) when local OCR is enabled
+    import_module("bot.ingestion.stats").get_engine_pool().warm_up()
+
+
+def warm_up_imports() -> None:
+    for module in ingestion_modules:
+        import_timed(module)
+
 
 @dataclass
 class Commands:
     register: Register = Register()
+    role: Role = Role()
     reset: Reset = Reset()
     play: Play = Play()
     playlist: Playlist = Playlist()
     remove: Remove = Remove()
     close: Close = Close()
+    weights: Weights = Weights()
     upload: Upload = Upload()
     vote: Vote = Vote()
     force_vote: ForceVote = ForceVote()
@@ -62,17 +93,24 @@ class MatchMaker(Client):
     async def on_ready(self):
         print(f"Logged on as {self.user}!")
         ClientSingleton.set_client(self)  # Set the client globally
-        await init_beanie(
-            database=get_db(),
-            document_models=[
-                User,
-                MatchDocument,
-                StandingsDocument,
-            ],
-        )
-        from_redis_playing_list = await self.redis.get("playing_list")
-        from_redis_playing_list_ids = await self.redis.get("playing_list_ids")
-        redis_match_id = await self.redis.get("last_match_id")
+        if ocr_warm_up:
+            # Load the OCR models in the background, so the first upload does not pay for it
+            create_task(to_thread(warm_up_ocr))
+        if ingestion_warm_up:
+            create_task(self.warm_up_ingestion())
+        with timed("init_beanie"):
+            await init_beanie(
+                database=get_db(),
+                document_models=[
+                    User,
+                    MatchDocument,
+                    StandingsDocument,
+                ],
+            )
+        with timed("load state from redis"):
+            from_redis_playing_list = await self.redis.get("playing_list")
+            from_redis_playing_list_ids = await self.redis.get("playing_list_ids")
+            redis_match_id = await self.redis.get("last_match_id")
         from_redis_last_match_id = redis_match_id if redis_match_id else None
         self.playing_list = (
             [(player, tag) for player, tag in loads(from_redis_playing_list)] if from_redis_playing_list else []
@@ -91,6 +129,14 @@ class MatchMaker(Client):
         # ]
         self.playing_list_ids = loads(from_redis_playing_list_ids) if from_redis_playing_list_ids else {}
         self.last_match_id = PydanticObjectId(from_redis_last_match_id) if from_redis_last_match_id else None
+        logger.info(startup_report())
+
+    async def warm_up_ingestion(self) -> None:
+        # Import the upload pipeline and start the recognition workers in the background, instead of on the first upload
+        await to_thread(warm_up_imports)
+        with timed("start recognition workers"):
+            await self.commands.upload.recognition_executor.warm_up()
+        logger.info(f"Ingestion warmed up. {startup_report()}")
 
     async def send_ready_list(self, message: Message):
         output_string = "Ready to play: \n"
@@ -120,6 +166,12 @@ class MatchMaker(Client):
             case ["!register", *summoner]:
                 await getattr(self.commands, "register").execute(message, summoner)
                 await self.commands.register.show_log(message, summoner)
+            case ["!role", *role]:
+                await getattr(self.commands, "role").execute(message, role)
+                await self.commands.role.show_log(message, role)
+            case ["!weights", *weights]:
+                await getattr(self.commands, "weights").execute(message, weights)
+                await self.commands.weights.show_log(message, weights)
             case ["!vote", *player]:
                 await getattr(self.commands, "vote").execute(message, player, message.author.id)
                 await self.commands.vote.show_log(message, player)
@@ -6,7 +6,8 @@ from discord import Message
 
 from api.models.user import User
 from bot.commands import Command
-from bot.exceptions import SummonerNotFound
+from bot.consts import roles
+from bot.exceptions import InvalidRole, SummonerNotFound
 from bot.scrapper import get_rank_v3
 
 logger = getLogger(__name__)
@@ -52,3 +53,25 @@ class Register(Command):
             f"Username '{summoner}' and Tag '{tag}' successfully "
             f"{'registered' if not updated else 'updated'}, tied to {message.author.name}"
         )
+
+
+@dataclass
+class Role(Command):
+    name: str = "role"
+    description: str = "Set your main role, teams are drawn so each one has every role covered"
+    usage: str = "!role <top|jungle|mid|bottom|support>"
+    example: str = "!role mid"
+
+    async def execute(self, message: Message, *args):
+        user = await User.get_by_discord_id(int(message.author.id))
+        if not user:
+            await message.channel.send("You are not registered, please register first.")
+            return
+        role = " ".join(*args).lower()
+        if role not in roles:
+            await message.channel.send(InvalidRole(role).detail)
+            return
+        user.main_role = role
+        user.last_modified = datetime.utcnow()
+        await user.save()
+        await message.channel.send(f"Main role of '{user.summoner}' set to {role}")
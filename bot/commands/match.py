@@ -1,13 +1,11 @@
-from asyncio import Task, create_task
+from asyncio import Task, create_task, to_thread
 from dataclasses import dataclass, field
 from logging import getLogger
 from os import environ
+from typing import TYPE_CHECKING
 
 from aiohttp import ClientSession
-import cv2
 from discord import File, Message, utils
-import numpy as np
-from PIL import Image
 
 from api.consts import Champion
 from api.models.match import MatchDocument
@@ -15,10 +13,21 @@ from api.models.user import User
 from bot import get_project_root
 from bot.commands import Command
 from bot.commands.post_match import show_mvp
-from bot.exceptions import GeminiError
-from bot.helpers import balance, beautify_teams
-from bot.ingestion.gemini import create_match
-from bot.ingestion.match import ImageRecognition
+from bot.consts import lobby_size, local_extraction, max_players
+from bot.exceptions import GeminiError, InvalidWeights, RecognitionQueueFull
+from bot.helpers import (
+    BalanceWeights,
+    balance,
+    beautify_teams,
+    get_balance_context,
+    get_balance_weights,
+    set_balance_weights,
+)
+from bot.ingestion.executor import RecognitionExecutor
+from bot.startup import import_timed
+
+if TYPE_CHECKING:
+    import numpy as np
 
 logger = getLogger("discord.client")
 
@@ -56,7 +65,7 @@ class Play(Command):
     example: str = "!play"
 
     async def execute(self, message: Message, *args):
-        if len(self.client.playing_list) == 10:
+        if len(self.client.playing_list) >= max_players:
             await message.channel.send("The lobby is full.")
         else:
             player = await User.get_by_discord_id(int(message.author.id))
@@ -91,6 +100,28 @@ class Remove(Command):
             await message.channel.send("You are not in the lobby.")
 
 
+@dataclass
+class Weights(Command):
+    name: str = "weights"
+    description: str = "Show or set how much rank, main roles, win rates and repeated teams count when drawing teams"
+    usage: str = "!weights [rank=<weight>] [roles=<weight>] [win_rate=<weight>] [repeats=<weight>]"
+    example: str = "!weights roles=20 repeats=0"
+
+    async def execute(self, message: Message, *args):
+        weights = await get_balance_weights(self.client.redis, message.guild.id)
+        if args and args[0]:
+            if "Admin".lower() not in [role.name.lower() for role in message.author.roles]:
+                await message.channel.send("You don't have permission to change the weights.")
+                return
+            try:
+                weights = BalanceWeights.parse(" ".join(*args), weights)
+            except InvalidWeights as e:
+                await message.channel.send(e.detail)
+                return
+            await set_balance_weights(self.client.redis, message.guild.id, weights)
+        await message.channel.send(f"Team draw weights: {weights}")
+
+
 @dataclass
 class Close(Command):
     name: str = "close"
@@ -99,52 +130,72 @@ class Close(Command):
     example: str = "!close"
 
     async def execute(self, message: Message, *args):
-        if len(self.client.playing_list) < 10:
+        if len(self.client.playing_list) < lobby_size:
             await message.channel.send("You don't have enough players to play, you need at least 10")
         else:
             output_string = "Ready to play: \n"
             for index, player in enumerate(self.client.playing_list, start=1):
                 output_string += "{}. {}\n".format(index, player[0])
             await message.channel.send(output_string)
+            # As many full lobbies as the players fill, in the order they joined, the others wait for the next draw
+            playing = len(self.client.playing_list) // lobby_size * lobby_size
+            drawn, waiting = self.client.playing_list[:playing], self.client.playing_list[playing:]
+            if waiting:
+                await message.channel.send(
+                    f"Only full lobbies play, first in the next draw: {', '.join(player[0] for player in waiting)}"
+                )
+                # The waiting players move to the front, so the next !close draws them before the ones playing now
+                self.client.playing_list = waiting + drawn
+                create_task(self.update_redis_playing_list())
             await message.channel.send("Starting the draw! Give me some seconds.")
-            blue_team, red_team, ranks = await balance(self.client.playing_list)
-            await message.channel.send(beautify_teams(blue_team, red_team, ranks, self.client.guilds[0].emojis))
-            blue_team_channel = utils.get(
-                self.client.guilds[0].channels, name=environ.get("BLUE_TEAM_CHANNEL", "Team 1")
-            )
-            red_team_channel = utils.get(self.client.guilds[0].channels, name=environ.get("RED_TEAM_CHANNEL", "Team 2"))
-            for player in blue_team.get("players"):
-                try:
-                    await (
-                        self.client.guilds[0]
-                        .get_member(int(self.client.playing_list_ids.get(player[0])))
-                        .move_to(blue_team_channel)
-                    )
-                except TypeError:
-                    logger.error(f"Player {player} could not be moved to the blue team channel")
-            for player in red_team.get("players"):
-                try:
-                    await (
-                        self.client.guilds[0]
-                        .get_member(int(self.client.playing_list_ids.get(player[0])))
-                        .move_to(red_team_channel)
-                    )
-                except TypeError:
-                    logger.error(f"Player {player} could not be moved to the red team channel")
+            weights = await get_balance_weights(self.client.redis, message.guild.id)
+            context = await get_balance_context(self.client.playing_list_ids)
+            lobbies, ranks = await balance(drawn, weights, context)
+            for index, (blue_team, red_team) in enumerate(lobbies):
+                if len(lobbies) > 1:
+                    await message.channel.send(f"Lobby {index + 1}")
+                await message.channel.send(beautify_teams(blue_team, red_team, ranks, self.client.guilds[0].emojis))
+                blue_channel_name, red_channel_name = self.team_channel_names(index)
+                for team, channel_name in ((blue_team, blue_channel_name), (red_team, red_channel_name)):
+                    await self.move_players(team.get("players"), channel_name)
+            if len(lobbies) > 1:
+                await message.channel.send(
+                    "Only one match at a time is followed after the game: !upload a lobby's result once the MVP vote "
+                    "of the previous one is over."
+                )
+
+    @staticmethod
+    def team_channel_names(lobby: int) -> tuple[str, str]:
+        # Team 1 and Team 2 for the first lobby, unless set otherwise, Team 3 and Team 4 for the second, and so on
+        if not lobby:
+            return environ.get("BLUE_TEAM_CHANNEL", "Team 1"), environ.get("RED_TEAM_CHANNEL", "Team 2")
+        return f"Team {2 * lobby + 1}", f"Team {2 * lobby + 2}"
+
+    async def move_players(self, players: list[str], channel_name: str):
+        channel = utils.get(self.client.guilds[0].channels, name=channel_name)
+        if channel is None:
+            # Moving to no channel would disconnect the players from voice
+            logger.error(f"There is no {channel_name} channel, players {players} were not moved")
+            return
+        for player in players:
+            try:
+                await self.client.guilds[0].get_member(int(self.client.playing_list_ids.get(player))).move_to(channel)
+            except (TypeError, AttributeError):
+                logger.error(f"Player {player} could not be moved to the {channel_name} channel")
 
 
 @dataclass
 class Upload(Command):
     name: str = "upload"
     description: str = (
-        "Upload a screenshot to create a match, "
+        "Upload a screenshot to create a match and start its MVP vote, one match at a time, "
         "please capture between starting on (0,0) coordinates "
         "of the client and end before reaching the friends list, "
         "so you can see until the bans + objectives"
     )
     usage: str = "!upload"
     example: str = "!upload"
-    image_recognition: ImageRecognition = field(default_factory=ImageRecognition)
+    recognition_executor: RecognitionExecutor = field(default_factory=RecognitionExecutor)
 
     async def execute(self, message: Message, *args):
         async with ClientSession() as session:
@@ -152,31 +203,70 @@ class Upload(Command):
                 # Read the image as bytes
                 image_bytes = await response.read()
 
-                # Convert the bytes to a numpy array
-                image_array = np.frombuffer(image_bytes, np.uint8)
-
-                # Decode the image using OpenCV
-                image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
                 await message.channel.send("Processing image, this may take a few seconds...")
-                self.image_recognition.set_screenshot(image)
-                champions = self.image_recognition.get_champions()
+                try:
+                    # Decoding and recognition run in a worker process, which sends the decoded image back
+                    champions, bans, portraits, image = await self.recognition_executor.recognize(image_bytes)
+                except RecognitionQueueFull as e:
+                    await message.channel.send(e.detail)
+                    return
+
                 if champions is not None:
                     # Run create_match in a background task
-                    task: Task = create_task(self.run_create_match(image, champions, message))
+                    task: Task = create_task(self.run_create_match(image, champions, bans, portraits, message))
                     # Notify when the task is completed
                     task.add_done_callback(lambda t: create_task(self.on_task_complete(t, message)))
 
     async def run_create_match(
-        self, image: np.ndarray, champions: list[Champion | None], message: Message
+        self,
+        image: "np.ndarray",
+        champions: list[Champion | None],
+        bans: tuple[list[Champion], list[Champion]],
+        portraits: list[tuple[int, int, int, int]],
+        message: Message,
     ) -> MatchDocument:
         try:
+            if local_extraction:
+                match = await self.create_match_locally(image, champions, bans, message)
+                if match:
+                    return match
             # Run the create_match function asynchronously
-            result: MatchDocument = await create_match(self.client, Image.fromarray(image), champions, True, message)
+            gemini = await to_thread(import_timed, "bot.ingestion.gemini")
+            result: MatchDocument = await gemini.create_match(
+                self.client, image, champions, True, message, bans=bans, portraits=portraits
+            )
             return result
         except (Exception, GeminiError) as e:
             # Handle exceptions and notify user
             await message.channel.send(f"An error occurred while creating the match: {e}")
 
+    async def create_match_locally(
+        self,
+        image: "np.ndarray",
+        champions: list[Champion | None],
+        bans: tuple[list[Champion], list[Champion]],
+        message: Message,
+    ) -> MatchDocument | None:
+        # Victory or defeat is shown from the uploader's side, so their summoner tells which team won
+        user = await User.get_by_discord_id(int(message.author.id))
+        if not user:
+            return None
+        local = await to_thread(import_timed, "bot.ingestion.local")
+        match, problems = await to_thread(local.extract_match, image, user.summoner)
+        if match is None or problems:
+            logger.info(f"Local extraction failed, asking the model instead: {'; '.join(problems)}")
+            return None
+        gemini = await to_thread(import_timed, "bot.ingestion.gemini")
+        return await gemini.store_match(
+            self.client,
+            match.model_dump(),
+            image,
+            champions,
+            True,
+            message,
+            bans=bans,
+        )
+
     async def on_task_complete(self, task: Task, message: Message) -> None:
         try:
             match: MatchDocument = task.result()
@@ -1,3 +1,4 @@
+from asyncio import create_task
 from collections import Counter
 from dataclasses import dataclass
 from os import environ
@@ -40,14 +41,24 @@ class Vote(Command):
 
     async def finalize(self):
         lobby_channel = utils.get(self.client.guilds[0].channels, name=environ.get("LOBBY_CHANNEL", "Lobby"))
-        for discord_id in self.client.playing_list_ids.values():
-            await self.client.guilds[0].get_member(int(discord_id)).move_to(lobby_channel)
+        # Only the players of this match are done, the ones still playing in other lobbies or waiting for a draw stay
+        match = self.client.last_match
+        players = match.blue_team.players + match.red_team.players
+        match_ids, match_names = {player.discord_id for player in players}, {player.name for player in players}
+        finished = {
+            summoner: int(discord_id)
+            for summoner, discord_id in self.client.playing_list_ids.items()
+            if int(discord_id) in match_ids or summoner in match_names
+        }
+        for summoner, discord_id in finished.items():
+            self.client.playing_list_ids.pop(summoner)
+            await self.client.guilds[0].get_member(discord_id).move_to(lobby_channel)
+        self.client.playing_list = [player for player in self.client.playing_list if player[0] not in finished]
+        create_task(self.update_redis_playing_list())
         self.client.last_match = None
         self.client.last_match_id = None
         self.client.mvp_votes = dict()
         self.client.eligible_mvps = []
-        self.client.playing_list = []
-        self.client.playing_list_ids = {}
 
     def get_most_common_ids_and_votes(self) -> tuple[list[Player], int]:
         # Count the occurrences of each ID in the list of values
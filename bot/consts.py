@@ -1,3 +1,4 @@
+from os import environ
 from os.path import normpath
 
 from bot import get_project_root
@@ -72,7 +73,52 @@ points = {
 
 data_folder = normpath(f"{get_project_root()}/data")
 matches_folder = normpath(f"{data_folder}/matches")
+atlas_folder = normpath(f"{data_folder}/atlas")
 
 threshold = 5  # max number of points of difference between teams
+lobby_size = 10
+max_players = int(environ.get("MAX_PLAYERS", "100"))  # in the playing list, split into as many lobbies as they fill
+roles = ("top", "jungle", "mid", "bottom", "support")
+# How much each term counts when teams are drawn, per point of rank, duplicated main role, summed win rate and
+# repeated teammate pair. Servers can set their own with !weights.
+balance_weights = environ.get("BALANCE_WEIGHTS", "rank=1 roles=10 win_rate=50 repeats=2")
+balance_history = int(environ.get("BALANCE_HISTORY", "20"))  # recent matches the win rates are taken from
 
 refresh_interval = 600  # in seconds
+
+recognition_workers = int(environ.get("RECOGNITION_WORKERS", "1"))  # processes running champion recognition
+recognition_queue_depth = int(environ.get("RECOGNITION_QUEUE_DEPTH", "4"))  # max screenshots queued or in progress
+
+ocr_engines = int(environ.get("OCR_ENGINES", "1"))  # RapidOCR engines, each serves one OCR job at a time
+ocr_warm_up = environ.get("OCR_WARM_UP", "0") == "1"  # load the OCR engines when the bot starts
+# ONNX Runtime threads per engine, -1 leaves the choice to ONNX Runtime
+ocr_intra_op_threads = int(environ.get("OCR_INTRA_OP_THREADS", "-1"))
+ocr_inter_op_threads = int(environ.get("OCR_INTER_OP_THREADS", "-1"))
+
+# Read uploads with local OCR first and only ask the model when the result does not add up
+local_extraction = environ.get("LOCAL_EXTRACTION", "0") == "1"
+
+# Screenshots sent to the model are cropped to the scoreboard, downscaled to at most this many pixels and re-encoded
+upload_max_pixels = int(environ.get("UPLOAD_MAX_PIXELS", "1600000"))
+upload_format = environ.get("UPLOAD_FORMAT", "webp")  # webp or jpeg
+upload_quality = int(environ.get("UPLOAD_QUALITY", "90"))  # 0 to 100
+
+# Model extractions are cached by screenshot, so a repeated upload skips the model call
+extraction_cache_ttl = int(environ.get("EXTRACTION_CACHE_TTL", str(7 * 24 * 3600)))  # in seconds
+# exact: same decoded pixels, perceptual: also re-compressed or slightly resized copies
+extraction_cache_mode = environ.get("EXTRACTION_CACHE_MODE", "exact")
+
+# Ask the secondary model too when the primary is slower than this percentile of its recent answers
+hedge_percentile = float(environ.get("HEDGE_PERCENTILE", "0.9"))
+hedge_initial_delay = float(environ.get("HEDGE_INITIAL_DELAY", "30"))  # in seconds, until enough answers were timed
+
+# Import the upload pipeline and start the recognition workers when the bot starts, instead of on the first upload
+ingestion_warm_up = environ.get("INGESTION_WARM_UP", "0") == "1"
+
+# Where match extraction is sent: gemini, or replay for recorded answers, offline, to load test the upload pipeline
+model_backend = environ.get("MODEL_BACKEND", "gemini")
+# Screenshots, and their recorded answers in a responses folder next to them, named after each screenshot
+replay_folder = environ.get("REPLAY_FOLDER", normpath(f"{get_project_root()}/tests/data"))
+replay_latency = float(environ.get("REPLAY_LATENCY", "2"))  # in seconds, before each answer
+replay_jitter = float(environ.get("REPLAY_JITTER", "0.5"))  # in seconds, added at random to the latency
+replay_error_rate = float(environ.get("REPLAY_ERROR_RATE", "0"))  # fraction of requests that fail
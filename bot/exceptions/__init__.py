@@ -22,3 +22,21 @@ class ChampionMismatch(BotException):
 class GeminiError(BotException):
     def __init__(self):
         self.detail = "An error occurred while processing the image"
+
+
+class RecognitionQueueFull(BotException):
+    def __init__(self):
+        self.detail = "Too many screenshots are being processed right now, please try again in a few seconds"
+
+
+class InvalidWeights(BotException):
+    def __init__(self, weights: str):
+        self.detail = (
+            f"Invalid weights '{weights}'. Use <term>=<weight>, with terms rank, roles, win_rate and repeats, "
+            f"e.g. rank=1 roles=10"
+        )
+
+
+class InvalidRole(BotException):
+    def __init__(self, role: str):
+        self.detail = f"Invalid role '{role}'. Choose one of top, jungle, mid, bottom or support."
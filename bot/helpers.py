@@ -1,74 +1,138 @@
-from asyncio import gather
-from copy import deepcopy
-from random import randint, sample
+from asyncio import gather, to_thread
+from collections import Counter
+from dataclasses import asdict, dataclass, fields, replace
+from math import isfinite
+from random import sample
+from typing import TYPE_CHECKING
 
+from beanie.operators import In
 from discord import utils
 
-from bot.consts import points, threshold
+from api.models.match import MatchDocument
+from api.models.user import User
+from bot.consts import balance_history, balance_weights, points, threshold
+from bot.exceptions import InvalidWeights
 from bot.scrapper import get_rank_v3
+from bot.startup import import_timed
 
+if TYPE_CHECKING:
+    from aioredis import Redis
 
-async def draw(
-    mid_point: float, list_ranked_summoners: list[tuple[str, int]]
-) -> tuple[dict[str, int | list], dict[str, int | list]]:
-    blue_team = {"score": 0, "players": []}
-    while blue_team["score"] < mid_point:
-        random_index = randint(0, len(list_ranked_summoners) - 1)
-        random_summoner = list_ranked_summoners[random_index]
-        blue_team["players"].append(random_summoner[0])
-        blue_team["score"] += random_summoner[1]
-        list_ranked_summoners.pop(random_index)
-        if len(blue_team.get("players")) == 4:
-            comparison_value = mid_point - blue_team["score"]
-            elected_summoner = 0
-            min_value = abs(list_ranked_summoners[0][1] - comparison_value)
-            for j in range(0, len(list_ranked_summoners) - 1):
-                if abs(list_ranked_summoners[j][1] - comparison_value) < min_value:
-                    elected_summoner = j
-                    min_value = abs(list_ranked_summoners[j][1] - comparison_value)
-            blue_team["players"].append(list_ranked_summoners[elected_summoner][0])
-            blue_team["score"] += list_ranked_summoners[elected_summoner][1]
-            list_ranked_summoners.pop(elected_summoner)
-            break
-        if len(blue_team["players"]) == 5:
-            break
-    red_team = {
-        "score": mid_point * 2 - blue_team.get("score"),
-        "players": [summoner[0] for summoner in list_ranked_summoners],
-    }
-    return blue_team, red_team
+
+@dataclass
+class BalanceWeights:
+    # Per point of rank beyond the threshold, duplicated main role, summed win rate and repeated teammate pair
+    rank: float = 1
+    roles: float = 0
+    win_rate: float = 0
+    repeats: float = 0
+
+    @classmethod
+    def parse(cls, text: str, base: "BalanceWeights | None" = None) -> "BalanceWeights":
+        """
+        Weights from "rank=1 roles=10", the terms left out keep their weight in `base`
+        """
+        try:
+            weights = {term: float(weight) for term, weight in (pair.split("=") for pair in text.split())}
+            if any(not isfinite(weight) or weight < 0 for weight in weights.values()):
+                raise ValueError()
+            return replace(base or cls(), **weights)
+        except (TypeError, ValueError):
+            raise InvalidWeights(text)
+
+    def __str__(self) -> str:
+        return " ".join(f"{term.name}={getattr(self, term.name):g}" for term in fields(self))
+
+
+default_weights = BalanceWeights.parse(balance_weights)
+
+
+async def get_balance_weights(redis: "Redis", guild_id: int) -> BalanceWeights:
+    weights = await redis.get(f"balance_weights:{guild_id}")
+    return BalanceWeights.parse(weights) if weights else default_weights
+
+
+async def set_balance_weights(redis: "Redis", guild_id: int, weights: BalanceWeights) -> None:
+    await redis.set(f"balance_weights:{guild_id}", str(weights))
+
+
+@dataclass
+class BalanceContext:
+    # By summoner, for the players in the lobby
+    main_roles: dict[str, str | None]
+    win_rates: dict[str, float]
+    last_teams: dict[str, int]  # 0 for blue and 1 for red, for those who played the last match
+
+
+async def get_balance_context(playing_list_ids: dict[str, int], matches: int = balance_history) -> BalanceContext:
+    """
+    Main roles of the lobby's players, their win rates over the last `matches` matches and their teams in the last one
+    """
+    summoners = {discord_id: summoner for summoner, discord_id in playing_list_ids.items()}
+    users = await User.find(In(User.discord_id, list(summoners))).to_list()
+    recent_matches = await MatchDocument.find_all().sort("-date").limit(matches).to_list()
+    wins, games, last_teams = Counter(), Counter(), {}
+    for index, match in enumerate(recent_matches):
+        for team_index, team in enumerate(["blue", "red"]):
+            for player in getattr(match, f"{team}_team").players:
+                if player.discord_id not in summoners:
+                    continue
+                games[player.discord_id] += 1
+                wins[player.discord_id] += match.winner == team
+                if not index:
+                    last_teams[summoners[player.discord_id]] = team_index
+    return BalanceContext(
+        {user.summoner: user.main_role for user in users},
+        # One win and one loss assumed on top, so players with few matches stay close to 50%
+        {summoner: (wins[discord_id] + 1) / (games[discord_id] + 2) for discord_id, summoner in summoners.items()},
+        last_teams,
+    )
 
 
 async def balance(
     summoners: list[tuple[str, str]],
-) -> tuple[dict[str, int | list], dict[str, int | list], dict[str, str]]:
+    weights: BalanceWeights | None = None,
+    context: BalanceContext | None = None,
+) -> tuple[list[tuple[dict[str, int | list], dict[str, int | list]]], dict[str, str]]:
+    """
+    Blue and red teams of every lobby, the summoners being a multiple of ten, and the summoners' ranks
+    """
     tasks = []
-    mid_point = 0
-    draws = 0
     for summoner, tag in summoners:
         tasks.append(get_rank_v3(summoner, tag))
     results = await gather(*tasks)
     print(results)
     summoners = [summoner[0] for summoner in summoners]
     mapped_results = {result[0]: result[1] for result in results}
-    shuffled_summoners = sample(summoners, 10)
+    shuffled_summoners = sample(summoners, len(summoners))
     normalized_points = {k.lower(): v for k, v in points.items()}  # Ensure all keys are lowercase
     ranked_summoners = {
         summoner: normalized_points.get(mapped_results.get(summoner).lower()) for summoner in shuffled_summoners
     }
-    for summoner, evaluation in ranked_summoners.items():
-        mid_point += evaluation
-    mid_point /= 2
-    list_ranked_summoners = list(ranked_summoners.items())
-    blue_team, red_team = await draw(mid_point, deepcopy(list_ranked_summoners))
-    draws += 1
-    initial_threshold = threshold
-    while abs(blue_team.get("score") - red_team.get("score")) > initial_threshold:
-        blue_team, red_team = await draw(mid_point, deepcopy(list_ranked_summoners))
-        draws += 1
-        if draws >= 1000:
-            initial_threshold += 1
-    return blue_team, red_team, mapped_results
+    scores = list(ranked_summoners.values())
+    # Loaded on first use, with NumPy, the bot imports the commands long before it draws any teams
+    balancing = await to_thread(import_timed, "bot.balancing")
+    # In each lobby, any split within the threshold can be drawn, so lobbies vary, otherwise one of the closest ones.
+    # With weights on the other terms, one of the cheapest splits that no other one beats on every term.
+    lobbies = await to_thread(
+        balancing.partition,
+        scores,
+        threshold,
+        weights=asdict(weights) if weights else None,
+        main_roles=[context.main_roles.get(summoner) for summoner in shuffled_summoners] if context else None,
+        win_rates=[context.win_rates.get(summoner, 0.5) for summoner in shuffled_summoners] if context else None,
+        last_teams=[context.last_teams.get(summoner) for summoner in shuffled_summoners] if context else None,
+    )
+    return [
+        tuple(
+            {
+                "score": sum(scores[index] for index in indices),
+                "players": [shuffled_summoners[index] for index in indices],
+            }
+            for indices in (blue_indices, red_indices)
+        )
+        for blue_indices, red_indices, _ in lobbies
+    ], mapped_results
 
 
 def beautify_teams(
@@ -0,0 +1,82 @@
+from asyncio import Task, create_task, to_thread
+from dataclasses import dataclass, field
+from functools import lru_cache
+from logging import getLogger
+from os import makedirs, replace
+from os.path import exists
+from uuid import uuid4
+
+import cv2
+import numpy as np
+
+from bot.consts import matches_folder
+
+logger = getLogger("artifacts")
+
+# Quality above 100 makes OpenCV's WebP encoder lossless
+lossless_webp = [cv2.IMWRITE_WEBP_QUALITY, 101]
+thumbnail_width = 320
+thumbnail_quality = 80
+
+
+@dataclass
+class ArtifactWriter:
+    """
+    Stores screenshots by content hash as lossless WebP, with a small lossy thumbnail next to each,
+    so a screenshot uploaded twice is only written once. Encoding runs in a thread, off the event loop.
+    """
+
+    folder: str = matches_folder
+    _tasks: set[Task] = field(default_factory=set, init=False, repr=False)
+
+    def paths(self, key: str) -> tuple[str, str]:
+        # Fanned out by the first two characters of the hash, so no folder grows too large
+        return f"{self.folder}/{key[:2]}/{key}.webp", f"{self.folder}/{key[:2]}/{key}.thumbnail.webp"
+
+    def write(self, image: np.ndarray, key: str) -> bool:
+        """
+        Encode and write the BGR screenshot and its thumbnail under `key`, False when they were already stored
+        """
+        path, thumbnail_path = self.paths(key)
+        if exists(path):
+            return False
+        makedirs(f"{self.folder}/{key[:2]}", exist_ok=True)
+        height, width = image.shape[:2]
+        thumbnail = cv2.resize(
+            image, (thumbnail_width, round(height * thumbnail_width / width)), interpolation=cv2.INTER_AREA
+        )
+        # The full image last, its presence marks the artifact as complete
+        for _path, _image, params in (
+            (thumbnail_path, thumbnail, [cv2.IMWRITE_WEBP_QUALITY, thumbnail_quality]),
+            (path, image, lossless_webp),
+        ):
+            # Write then rename, so a reader never sees a partial file. The temporary name is unique, the same
+            # screenshot uploaded twice at once is written twice, and the last rename wins with the same bytes
+            temporary_path = f"{_path}.{uuid4().hex}.tmp"
+            with open(temporary_path, "wb") as file:
+                file.write(cv2.imencode(".webp", _image, params)[1].tobytes())
+            replace(temporary_path, _path)
+        return True
+
+    async def store(self, image: np.ndarray, key: str) -> bool:
+        return await to_thread(self.write, image, key)
+
+    def submit(self, image: np.ndarray, key: str) -> Task:
+        """
+        Store in the background, the caller does not wait for the encoding or the disk
+        """
+        task = create_task(self.store(image, key))
+        # Keep a reference until it is done, the event loop only keeps weak ones
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+        return task
+
+    def _done(self, task: Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Could not store a screenshot: {task.exception()!r}")
+
+
+@lru_cache
+def get_artifact_writer() -> ArtifactWriter:
+    return ArtifactWriter()
@@ -0,0 +1,106 @@
+from asyncio import sleep
+from dataclasses import dataclass, field
+from functools import lru_cache
+from os import environ, listdir
+from os.path import exists
+from random import Random
+from typing import Any, Protocol
+
+from dotenv import load_dotenv
+
+from bot.consts import model_backend, replay_error_rate, replay_folder, replay_jitter, replay_latency
+from bot.ingestion.cache import content_hash
+from bot.ingestion.upload import PreparedImage, decode_screenshot
+from bot.startup import import_timed
+
+
+class ModelBackend(Protocol):
+    name: str
+
+    async def generate(self, prompt: str, upload: PreparedImage) -> str:
+        """
+        The model's answer to the prompt about the uploaded screenshot, as text
+        """
+
+
+@dataclass
+class GeminiBackend:
+    name: str
+    _model: Any = field(default=None, init=False, repr=False)
+
+    @property
+    def model(self):
+        # The Google client is only imported and configured when a request is made
+        if self._model is None:
+            genai = import_timed("google.generativeai")
+            load_dotenv()
+            genai.configure(api_key=environ.get("GOOGLE_API_KEY"))
+            self._model = genai.GenerativeModel(model_name=self.name)
+        return self._model
+
+    async def generate(self, prompt: str, upload: PreparedImage) -> str:
+        response = await self.model.generate_content_async([prompt, upload.blob])
+        return response.text
+
+
+class ReplayError(Exception):
+    pass
+
+
+@dataclass
+class ReplayBackend:
+    """
+    Stands in for a model, answering with the response recorded for the uploaded screenshot after `latency` seconds,
+    plus up to `jitter`. An `error_rate` fraction of the requests fail instead, like a model timing out.
+    """
+
+    name: str
+    responses: dict[str, str]  # recorded answers by screenshot content hash
+    latency: float = replay_latency
+    jitter: float = replay_jitter
+    error_rate: float = replay_error_rate
+    seed: int | None = None
+    requests: int = field(default=0, init=False)
+    _random: Random = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._random = Random(self.seed)
+
+    async def generate(self, prompt: str, upload: PreparedImage) -> str:
+        self.requests += 1
+        await sleep(self.latency + self._random.uniform(0, self.jitter))
+        if self._random.random() < self.error_rate:
+            raise ReplayError(f"{self.name} failed on purpose")
+        if upload.key not in self.responses:
+            raise ReplayError(f"{self.name} has no recorded answer for screenshot {upload.key}")
+        return self.responses[upload.key]
+
+
+def load_responses(folder: str = replay_folder) -> dict[str, str]:
+    """
+    Recorded answers in `folder`/responses, each named after its screenshot in `folder`, e.g. responses/test8.json
+    for test8.png, keyed by the screenshot's content hash
+    """
+    responses = {}
+    for response_name in sorted(listdir(f"{folder}/responses")):
+        name, extension = response_name.rsplit(".", 1)
+        if extension != "json" or not exists(f"{folder}/{name}.png"):
+            continue
+        with open(f"{folder}/{name}.png", "rb") as file:
+            key = content_hash(decode_screenshot(file.read()))
+        with open(f"{folder}/responses/{response_name}") as file:
+            responses[key] = file.read()
+    return responses
+
+
+@lru_cache
+def get_backends() -> tuple[ModelBackend, ModelBackend]:
+    """
+    The primary and secondary models, the secondary being the one hedged requests fall back to
+    """
+    if model_backend == "replay":
+        responses = load_responses()
+        return ReplayBackend("replay-pro", responses), ReplayBackend("replay-flash", responses)
+    if model_backend != "gemini":
+        raise ValueError(f"Unknown model backend {model_backend}, expected gemini or replay")
+    return GeminiBackend("gemini-1.5-pro"), GeminiBackend("gemini-1.5-flash")
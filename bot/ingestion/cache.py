@@ -0,0 +1,93 @@
+from asyncio import to_thread
+from dataclasses import dataclass
+from hashlib import sha256
+from json import dumps, loads
+from time import time
+from typing import TYPE_CHECKING, Literal
+
+import cv2
+import numpy as np
+
+from api.consts import Champion
+from bot.consts import extraction_cache_mode, extraction_cache_ttl
+from bot.ingestion.templates import dhash
+
+if TYPE_CHECKING:
+    from aioredis import Redis
+
+CacheMode = Literal["exact", "perceptual"]
+
+# A 32 x 32 dHash, 1024 bits. Re-encoding a screenshot as JPEG (quality 75+) flips up to 22 of them, while two
+# different scoreboards in tests/data are at least 84 apart. A close hash is also only trusted when the same champions
+# were recognized in both screenshots, see ExtractionCache.get
+perceptual_hash_size = 32
+max_perceptual_distance = 24
+
+
+def content_hash(image: np.ndarray) -> str:
+    # Of the decoded pixels, so the same screenshot hashes the same whatever its file's metadata
+    return sha256(str(image.shape).encode() + image.tobytes()).hexdigest()
+
+
+def perceptual_hash(image: np.ndarray) -> str:
+    return dhash(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), perceptual_hash_size).tobytes().hex()
+
+
+def hash_distance(first: str, second: str) -> int:
+    first_bits, second_bits = (np.frombuffer(bytes.fromhex(_hash), np.uint8) for _hash in (first, second))
+    return int(np.unpackbits(first_bits ^ second_bits).sum())
+
+
+@dataclass
+class ExtractionCache:
+    """
+    Match fields extracted from a screenshot, kept in Redis for `ttl` seconds under a hash of the screenshot.
+    In perceptual mode the dHash of every cached screenshot is also kept in a sorted set, scored by its expiry,
+    so a re-compressed copy finds the closest one.
+    """
+
+    redis: "Redis"
+    mode: CacheMode = extraction_cache_mode
+    ttl: int = extraction_cache_ttl
+    prefix: str = "extraction"
+
+    async def hashes(self, image: np.ndarray) -> tuple[str, str | None]:
+        """
+        The content hash of a screenshot, and its perceptual hash in perceptual mode, to look it up and store it by.
+        The content hash is also the screenshot's name once the match is saved.
+        """
+
+        def compute() -> tuple[str, str | None]:
+            return content_hash(image), perceptual_hash(image) if self.mode == "perceptual" else None
+
+        return await to_thread(compute)
+
+    async def get(self, hashes: tuple[str, str | None], champions: list[Champion | None]) -> dict | None:
+        """
+        The fields cached for the screenshot of these `hashes`, or in perceptual mode for a close enough one in which
+        the same `champions` were recognized
+        """
+        exact, perceptual = hashes
+        entry = await self.redis.get(f"{self.prefix}:exact:{exact}")
+        if entry is None and perceptual is not None:
+            index = f"{self.prefix}:perceptual"
+            # Forget the hashes whose fields have expired
+            await self.redis.zremrangebyscore(index, "-inf", time())
+            candidates = await self.redis.zrange(index, 0, -1)
+            distances = {candidate: hash_distance(perceptual, candidate) for candidate in candidates}
+            closest = min(distances, key=distances.get, default=None)
+            if closest is not None and distances[closest] <= max_perceptual_distance:
+                entry = await self.redis.get(f"{index}:{closest}")
+                # Another scoreboard of the same players can be close, their picks tell the games apart
+                if entry is not None and loads(entry)["champions"] != champions:
+                    entry = None
+        return loads(entry)["fields"] if entry is not None else None
+
+    async def set(self, hashes: tuple[str, str | None], fields: dict, champions: list[Champion | None]) -> None:
+        exact, perceptual = hashes
+        value = dumps({"fields": fields, "champions": champions}, default=str)
+        await self.redis.set(f"{self.prefix}:exact:{exact}", value, ex=self.ttl)
+        if perceptual is not None:
+            index = f"{self.prefix}:perceptual"
+            await self.redis.set(f"{index}:{perceptual}", value, ex=self.ttl)
+            await self.redis.zadd(index, {perceptual: time() + self.ttl})
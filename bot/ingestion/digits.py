@@ -0,0 +1,179 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from os import listdir
+
+import cv2
+import numpy as np
+
+from bot import get_project_root
+from bot.ingestion.templates import normalize_rows
+
+glyphs_folder = f"{get_project_root()}/bot/ingestion/glyphs"
+# Width and height every glyph is normalized to
+glyph_size = (18, 24)
+
+
+def stitch_crops(crops: list[np.ndarray], gap: int | None = None) -> tuple[np.ndarray, list[int]]:
+    """
+    Join grayscale crops side by side into one strip, returning the strip and the x where each crop's tile starts.
+    Tiles are padded by replicating their own border, so the gaps have the crop's background whatever its polarity.
+    """
+    height = max(crop.shape[0] for crop in crops)
+    # A gap as wide as a digit is tall is far wider than the spacing inside a number, so words never straddle tiles
+    gap = height if gap is None else gap
+    tiles = []
+    starts = []
+    offset = 0
+    for crop in crops:
+        top = (height - crop.shape[0]) // 2
+        tile = cv2.copyMakeBorder(
+            crop, top, height - crop.shape[0] - top, gap // 2, gap - gap // 2, cv2.BORDER_REPLICATE
+        )
+        starts.append(offset)
+        offset += tile.shape[1]
+        tiles.append(tile)
+    return np.hstack(tiles), starts
+
+
+def split_words(words: dict[str, list], starts: list[int], count: int) -> list[str]:
+    """
+    Map the words of a pytesseract image_to_data dict back to the tile their center falls in
+    """
+    texts = [""] * count
+    for word, left, width in zip(words["text"], words["left"], words["width"]):
+        text = str(word).strip()
+        if not text:
+            continue
+        index = bisect_right(starts, left + width / 2) - 1
+        texts[max(index, 0)] += text
+    return texts
+
+
+def scoreboard_gray(image: np.ndarray) -> np.ndarray:
+    # Grayscale screenshot where team 2's (red) text is white, like team 1's
+    mask = cv2.inRange(image, np.array([0, 0, 100]), np.array([50, 27, 255]))
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray[mask > 0] = 255
+    return gray
+
+
+def number_rois(gray: np.ndarray) -> list[tuple[int, int, int, int]]:
+    # Apply binary thresholding (You might need to adjust the threshold value)
+    _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
+
+    # Find contours
+    contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+
+    rois = []
+
+    # Loop over contours
+    for i, contour in enumerate(contours):
+        x, y, w, h = cv2.boundingRect(contour)
+
+        if 10 < h < 150 and 15 < w < 150 and 0.2 < w / h < 2.0:
+            roi = [x - 15, y - 20, w + 30, h + 40]
+            if rois:
+                if abs(rois[-1][0] - x) < 50:
+                    rois[-1] = [x - 5, rois[-1][1], rois[-1][2] + w + 10, rois[-1][3]]
+                else:
+                    # Store ROI coordinates
+                    rois.append(roi)
+            else:
+                rois.append(roi)
+
+    # Sort ROIs by their x-coordinate (from left to right)
+    rois = sorted(rois, key=lambda b: b[0])
+
+    return [(_roi[0] - 4, _roi[1] - 4, _roi[2] + 10, _roi[3] + 10) for _roi in rois]
+
+
+def number_crops(gray: np.ndarray) -> dict[str, list[np.ndarray]]:
+    # Grayscale crops of the objectives numbers (towers, inhibitors, barons, dragons, heralds, grubs) of each team,
+    # all views of one upscaled copy of the right side
+    height, width = gray.shape
+    right = gray[int(0.3 * height) : int(height * 0.9), int(width * 0.8) :]
+    right = cv2.resize(right, None, fx=3, fy=3, interpolation=cv2.INTER_CUBIC)
+    right_height = right.shape[0]
+
+    numbers_images = {
+        "blue": right[int(right_height * 0.3) : int(right_height * 0.45)],
+        "red": right[int(right_height * 0.80) :],
+    }
+    for team, part in numbers_images.items():
+        # Clamp to the part, the ROIs are padded and may start before it
+        numbers_images[team] = [part[max(y, 0) : y + h, max(x, 0) : x + w] for x, y, w, h in number_rois(part)]
+    return numbers_images
+
+
+def segment_glyphs(crop_gray: np.ndarray, min_height: float = 0.6) -> list[np.ndarray]:
+    """
+    Split a grayscale crop of a number into binary glyphs, left to right, each centered on a glyph_size canvas
+    """
+    _, binary = cv2.threshold(crop_gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # The font is light on a dark background, flip crops that came out the other way
+    if binary.mean() > 127:
+        binary = cv2.bitwise_not(binary)
+    _, _, boxes, _ = cv2.connectedComponentsWithStats(binary)
+    # Skip the background component
+    boxes = boxes[1:]
+    if not len(boxes):
+        return []
+
+    # Specks and the bottom of the objective icons are shorter than the digits
+    boxes = boxes[boxes[:, cv2.CC_STAT_HEIGHT] >= min_height * boxes[:, cv2.CC_STAT_HEIGHT].max()]
+    glyph_width, glyph_height = glyph_size
+    glyphs = []
+    for x, y, w, h, _ in sorted(boxes.tolist()):
+        # Pad to the glyph aspect ratio before resizing, so a 1 stays narrow instead of being stretched
+        canvas = np.zeros((h, max(w, round(h * glyph_width / glyph_height))), np.uint8)
+        left = (canvas.shape[1] - w) // 2
+        canvas[:, left : left + w] = binary[y : y + h, x : x + w]
+        glyphs.append(cv2.resize(canvas, glyph_size, interpolation=cv2.INTER_AREA))
+    return glyphs
+
+
+@dataclass
+class GlyphClassifier:
+    """
+    Nearest-neighbour reader for the scoreboard font, over labelled glyph samples from bot/ingestion/glyphs
+    """
+
+    samples: np.ndarray  # one normalized row per sample glyph
+    labels: np.ndarray  # digit of each sample
+    min_confidence: float = 0.6
+    min_margin: float = 0.05  # between the best digit and the runner-up
+
+    @classmethod
+    def from_folder(cls, folder: str = glyphs_folder) -> "GlyphClassifier":
+        # <digit>.png is a vertical sheet with every sample of that digit
+        samples = []
+        labels = []
+        for name in sorted(listdir(folder)):
+            sheet = cv2.imread(f"{folder}/{name}", cv2.IMREAD_GRAYSCALE)
+            glyphs = sheet.reshape(-1, glyph_size[1] * glyph_size[0])
+            samples.append(glyphs)
+            labels += [int(name.split(".")[0])] * len(glyphs)
+        return cls(normalize_rows(np.concatenate(samples)), np.array(labels))
+
+    def classify(self, glyphs: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Best digit of each glyph and whether it clears min_confidence and min_margin
+        """
+        scores = normalize_rows(np.stack(glyphs).reshape(len(glyphs), -1)) @ self.samples.T
+        # Best sample per digit, digits with no samples can never win
+        per_digit = np.full((len(glyphs), 10), -1.0, np.float32)
+        for digit in np.unique(self.labels):
+            per_digit[:, digit] = scores[:, self.labels == digit].max(axis=1)
+        ranked = np.sort(per_digit, axis=1)
+        confident = (ranked[:, -1] >= self.min_confidence) & (ranked[:, -1] - ranked[:, -2] >= self.min_margin)
+        return per_digit.argmax(axis=1), confident
+
+    def read(self, crop_gray: np.ndarray) -> str | None:
+        # None when any glyph is unsure, so the caller can fall back to Tesseract for the whole number
+        glyphs = segment_glyphs(crop_gray)
+        if not glyphs:
+            return None
+        digits, confident = self.classify(glyphs)
+        if not confident.all():
+            return None
+        return "".join(str(digit) for digit in digits)
@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from queue import Queue
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Iterator
+
+
+@dataclass
+class EngineStats:
+    calls: int = 0
+    wait: float = 0.0  # seconds spent queued for the engine, in total
+    max_wait: float = 0.0
+    inference: float = 0.0  # seconds spent running the engine, in total
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "calls": self.calls,
+            "mean_wait_ms": round(self.wait / self.calls * 1000, 2) if self.calls else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "mean_inference_ms": round(self.inference / self.calls * 1000, 2) if self.calls else 0.0,
+        }
+
+
+@dataclass
+class EnginePool:
+    """
+    A fixed number of engines shared between threads, each used by one caller at a time.
+    Engines are created on first use, or all up front by warm_up.
+    """
+
+    factory: Callable[[], Any]
+    size: int = 1
+    warm_up_input: Any = None
+    stats: list[EngineStats] = field(default_factory=list, init=False)
+    _idle: Queue = field(default_factory=Queue, init=False, repr=False)
+    _lock: Lock = field(default_factory=Lock, init=False, repr=False)
+
+    def _create(self) -> bool:
+        # Add an engine while under size, True when one was added. The engine is built under the lock and only then
+        # counted, so a failing factory leaves no slot behind for callers to wait on forever.
+        with self._lock:
+            if len(self.stats) >= self.size:
+                return False
+            engine = self.factory()
+            index = len(self.stats)
+            self.stats.append(EngineStats())
+        self._idle.put((index, engine))
+        return True
+
+    def warm_up(self) -> None:
+        # Create every engine and run each once, so model loading is paid before the first real call
+        while self._create():
+            pass
+        if self.warm_up_input is None:
+            return
+        engines = [self._idle.get() for _ in range(self.size)]
+        for _, engine in engines:
+            engine(self.warm_up_input)
+        for engine in engines:
+            self._idle.put(engine)
+
+    @contextmanager
+    def engine(self) -> Iterator[Any]:
+        start = perf_counter()
+        if self._idle.empty():
+            self._create()
+        index, engine = self._idle.get()
+        stats = self.stats[index]
+        waited = perf_counter() - start
+        stats.wait += waited
+        stats.max_wait = max(stats.max_wait, waited)
+        start = perf_counter()
+        try:
+            yield engine
+        finally:
+            stats.inference += perf_counter() - start
+            stats.calls += 1
+            self._idle.put((index, engine))
+
+    def __call__(self, *args, **kwargs) -> Any:
+        with self.engine() as engine:
+            return engine(*args, **kwargs)
+
+    def report(self) -> list[dict[str, float]]:
+        return [stats.as_dict() for stats in self.stats]
@@ -0,0 +1,81 @@
+from asyncio import gather, get_running_loop
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from types import ModuleType
+from typing import TYPE_CHECKING
+
+from api.consts import Champion
+from bot.consts import recognition_queue_depth, recognition_workers
+from bot.exceptions import RecognitionQueueFull
+from bot.startup import import_timed
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from bot.ingestion.match import Engine
+
+
+@dataclass
+class RecognitionExecutor:
+    """
+    Runs champion recognition in a process pool, so decoding and matching never block the event loop
+    """
+
+    workers: int = recognition_workers
+    max_queue: int = recognition_queue_depth
+    engine: "Engine" = "template"
+    _pool: ProcessPoolExecutor | None = field(default=None, init=False, repr=False)
+    _pending: int = field(default=0, init=False)
+
+    @property
+    def worker(self) -> ModuleType:
+        # Imported on first use, with OpenCV and the templates code under it
+        return import_timed("bot.ingestion.worker")
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        # Created on first use, the bot imports the commands long before it needs to recognize anything
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=get_context("spawn"),
+                initializer=self.worker.init_worker,
+                initargs=(self.engine,),
+            )
+        return self._pool
+
+    async def warm_up(self) -> None:
+        # Start every worker process, each loads its templates before running its first job
+        loop = get_running_loop()
+        await gather(*(loop.run_in_executor(self.pool, self.worker.ready) for _ in range(self.workers)))
+
+    async def recognize(
+        self, image_bytes: bytes
+    ) -> tuple[
+        list[Champion | None], tuple[list[Champion], list[Champion]], list[tuple[int, int, int, int]], "np.ndarray"
+    ]:
+        """
+        Picked champions, in portrait order, the (blue, red) bans, the portrait ROIs of a screenshot and the BGR
+        screenshot itself. Sending the decoded pixels back costs less than decoding the upload a second time.
+        """
+        if self._pending >= self.max_queue:
+            raise RecognitionQueueFull()
+        self._pending += 1
+        try:
+            pool = self.pool
+            try:
+                return await get_running_loop().run_in_executor(pool, self.worker.recognize, image_bytes)
+            except BrokenProcessPool:
+                # A worker died, e.g. killed for memory, and took the pool with it: start a new one and retry once
+                if self._pool is pool:
+                    self.shutdown()
+                return await get_running_loop().run_in_executor(self.pool, self.worker.recognize, image_bytes)
+        finally:
+            self._pending -= 1
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
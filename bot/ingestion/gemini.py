@@ -1,26 +1,26 @@
-from io import BytesIO
+from asyncio import to_thread
+from copy import deepcopy
+from functools import partial
 from json import loads
 from logging import getLogger
-from os import environ
+from time import perf_counter
 from typing import TYPE_CHECKING
 
-from aiofiles import open as async_open
 from discord import Message
-from dotenv import load_dotenv
-from google.api_core.exceptions import InternalServerError
-import google.generativeai as genai
-from PIL import Image
+import numpy as np
 
 from api.consts import Champion
 from api.models.match import MatchDocument
 from bot import get_project_root
-from bot.consts import matches_folder
-from bot.exceptions import GeminiError
+from bot.ingestion.artifacts import get_artifact_writer
+from bot.ingestion.backends import ModelBackend, get_backends
+from bot.ingestion.cache import ExtractionCache, content_hash
+from bot.ingestion.hedging import HedgedRequest, HedgePolicy
 from bot.ingestion.match import ImageRecognition
+from bot.ingestion.upload import PreparedImage, prepare_upload
 
-load_dotenv()
-genai.configure(api_key=environ.get("GOOGLE_API_KEY"))
-model = genai.GenerativeModel(model_name="gemini-1.5-pro")
+# Shared by every upload, so the hedge delay follows the primary model's recent latency
+hedge_policy = HedgePolicy()
 
 logger = getLogger("gemini")
 
@@ -28,19 +28,17 @@ if TYPE_CHECKING:
     from bot.client import MatchMaker
 
 
-async def save_image(path: str, image: memoryview) -> None:
-    async with async_open(path, "wb") as file:
-        await file.write(image)
+async def ask_model(backend: ModelBackend, prompt: str, upload: PreparedImage) -> dict:
+    response = await backend.generate(prompt, upload)
+    return loads(response.replace("```json", "").replace("```", ""))
 
 
-async def create_match(
-    client: "MatchMaker",
-    image: Image,
-    champions: list[Champion | None],
-    send_match_details: bool = False,
-    message: Message | None = None,
-) -> MatchDocument:
-    prompt = f"""
+def is_match_fields(fields: dict) -> bool:
+    return isinstance(fields, dict) and {"blue_team", "red_team"} <= fields.keys()
+
+
+def match_prompt(player_names: list[str]) -> str:
+    return f"""
     Based on this classes:\n
     class PlayerStats(BaseModel):
         kills: int
@@ -79,36 +77,98 @@ async def create_match(
         winner: Literal["blue", "red"]
     Create me a json reflecting the image I just gave you.\n
     Bear in mind these are the players names (not ordered): \n
-    {[summoner for summoner, tag in client.playing_list]}\n
+    {player_names}\n
+    """
+
+
+async def fetch_fields(
+    prompt: str, upload: PreparedImage, backends: tuple[ModelBackend, ModelBackend] | None = None
+) -> dict:
+    """
+    Match fields read from the upload by the primary model, hedged with the secondary, both from MODEL_BACKEND
+    unless given
+    """
+    start = perf_counter()
+    primary, secondary = backends or get_backends()
+    # The secondary model is asked too when the primary is slow, fails or answers something that is not a match
+    fields = await HedgedRequest(
+        partial(ask_model, primary, prompt, upload),
+        partial(ask_model, secondary, prompt, upload),
+        is_match_fields,
+        hedge_policy,
+    )()
+    logger.info(f"Match info fetched from {primary.name} or {secondary.name} in {perf_counter() - start:.2f}s")
+    return fields
+
+
+async def create_match(
+    client: "MatchMaker",
+    image: np.ndarray,
+    champions: list[Champion | None],
+    send_match_details: bool = False,
+    message: Message | None = None,
+    bans: tuple[list[Champion], list[Champion]] | None = None,
+    portraits: list[tuple[int, int, int, int]] | None = None,
+) -> MatchDocument:
+    """
+    Ask the model to read a BGR screenshot, sent cropped to the scoreboard, downscaled and re-encoded
+    """
+    prompt = match_prompt([summoner for summoner, tag in client.playing_list])
+    # A screenshot uploaded before, by anyone, is not sent to the model again
+    cache = ExtractionCache(client.redis)
+    # Hashed once, the content hash is also the upload's key and the stored screenshot's name
+    hashes = await cache.hashes(image)
+    json_response = await cache.get(hashes, champions)
+    cached = json_response is not None
+    if not cached:
+        upload = await to_thread(prepare_upload, image, portraits, key=hashes[0])
+        logger.info(
+            f"Trying to fetch match info, sending a {upload.width}x{upload.height} {upload.mime_type} "
+            f"of {len(upload.data)} bytes ({upload.width * upload.height / upload.source_pixels:.0%} of the pixels)"
+        )
+        json_response = await fetch_fields(prompt, upload)
+    else:
+        logger.info("Match info found in the extraction cache")
+    # store_match fills in the players and takes the champions, keep the model's answer as it was
+    fields, recognized = deepcopy(json_response), list(champions)
+    # The stored screenshot stays full size, as the upload
+    match = await store_match(
+        client, json_response, image, champions, send_match_details, message, bans, screenshot=hashes[0]
+    )
+    if not cached:
+        # Only an answer that made a valid, saved match is reused
+        await cache.set(hashes, fields, recognized)
+    return match
+
+
+async def store_match(
+    client: "MatchMaker",
+    fields: dict,
+    image: np.ndarray,
+    champions: list[Champion | None],
+    send_match_details: bool = False,
+    message: Message | None = None,
+    bans: tuple[list[Champion], list[Champion]] | None = None,
+    screenshot: str | None = None,
+) -> MatchDocument:
+    """
+    Save a match read from a screenshot, by the model or locally, with the players' Discord ids,
+    the recognized champions and bans, and the BGR screenshot itself, under its content hash when already known
     """
-    logger.info("Trying to fetch match info")
-    try:
-        response = await model.generate_content_async([prompt, image])
-    except InternalServerError:
-        new_model = genai.GenerativeModel(model_name="gemini-1.5-flash")
-        try:
-            print("Trying to fetch match info with flash model")
-            response = await new_model.generate_content_async([prompt, image])
-        except InternalServerError:
-            raise GeminiError()
-    logger.info("Match info fetched")
-    filtered_response = response.text.replace("```json", "").replace("```", "")
-    json_response = loads(filtered_response)
     # Convert all keys in the dictionary to lowercase for case-insensitive lookup
     lowercase_playing_list_ids = {k.lower(): v for k, v in client.playing_list_ids.items()}
     for team in ["blue", "red"]:
-        for player in json_response[f"{team}_team"]["players"]:
+        for player in fields[f"{team}_team"]["players"]:
             player["discord_id"] = lowercase_playing_list_ids.get(player["name"].lower())
             player["picked_champion"] = champions.pop(0)
-    match = MatchDocument(**json_response)
+    match = MatchDocument(**fields, screenshot=screenshot or await to_thread(content_hash, image))
+    # Bans come from local recognition, the model's guesses are not reliable
+    match.blue_team.bans, match.red_team.bans = bans if bans else ([], [])
     if send_match_details:
         await match.send_match_details(message)
-    match.blue_team.bans = []
-    match.red_team.bans = []
     await match.save()
-    buffer = BytesIO()
-    image.save(buffer, format="PNG")
-    await save_image(f"{matches_folder}/{str(match.id)}.png", buffer.getbuffer())
+    # Encoded and written in the background, the upload does not wait for the disk
+    get_artifact_writer().submit(image, match.screenshot)
     client.last_match = match
     return match
 
@@ -121,7 +181,10 @@ if __name__ == "__main__":
     from bot.mock.client import MockClient
 
     image_recognition = ImageRecognition()
-    image_recognition.set_screenshot(imread(f"{get_project_root()}/tests/data/test13.png"))
-    _champions = image_recognition.get_champions()
+    _image = imread(f"{get_project_root()}/tests/data/test13.png")
+    image_recognition.set_screenshot(_image.copy())
+    _portraits = image_recognition.calculate_rois()
+    _champions = image_recognition.get_raw_champions(_portraits, image_recognition.champion_bank)
+    _bans = image_recognition.get_bans(_portraits)
     _client = MockClient()
-    run(create_match(_client, Image.open(f"{get_project_root()}/tests/data/test13.png"), _champions))
+    run(create_match(_client, _image, _champions, bans=_bans, portraits=_portraits))
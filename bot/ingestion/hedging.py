@@ -0,0 +1,84 @@
+from asyncio import FIRST_COMPLETED, Task, create_task, wait
+from collections import deque
+from dataclasses import dataclass, field
+from logging import getLogger
+from time import perf_counter
+from typing import Awaitable, Callable, Generic, TypeVar
+
+import numpy as np
+
+from bot.consts import hedge_initial_delay, hedge_percentile
+from bot.exceptions import GeminiError
+
+logger = getLogger("hedging")
+
+T = TypeVar("T")
+
+
+@dataclass
+class HedgePolicy:
+    """
+    When to hedge: after the `percentile` of the primary's recent latencies, or `initial_delay` seconds
+    until `min_samples` of them were timed. The latency of a cancelled primary is how long it ran, a lower bound.
+    """
+
+    percentile: float = hedge_percentile
+    initial_delay: float = hedge_initial_delay
+    min_samples: int = 5
+    window: int = 50
+    latencies: deque[float] = field(default_factory=deque, init=False, repr=False)
+
+    def __post_init__(self):
+        self.latencies = deque(maxlen=self.window)
+
+    def record(self, latency: float) -> None:
+        self.latencies.append(latency)
+
+    @property
+    def delay(self) -> float:
+        if len(self.latencies) < self.min_samples:
+            return self.initial_delay
+        return float(np.quantile(self.latencies, self.percentile))
+
+
+@dataclass
+class HedgedRequest(Generic[T]):
+    """
+    Runs `primary`, and `secondary` as well once the primary has taken longer than the policy's delay, failed or
+    answered something `validate` rejects. The first valid answer wins and the other request is cancelled.
+    """
+
+    primary: Callable[[], Awaitable[T]]
+    secondary: Callable[[], Awaitable[T]]
+    validate: Callable[[T], bool] = lambda _: True
+    policy: HedgePolicy = field(default_factory=HedgePolicy)
+
+    async def __call__(self) -> T:
+        start = perf_counter()
+        primary = create_task(self.primary())
+        pending: set[Task] = {primary}
+        secondary: Task | None = None
+        try:
+            while pending:
+                # Wait for the primary alone until the hedge delay, then for whichever answers first
+                timeout = max(self.policy.delay - (perf_counter() - start), 0) if secondary is None else None
+                done, pending = await wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for task in done:
+                    if task is primary and not task.exception():
+                        self.policy.record(perf_counter() - start)
+                    if not task.exception() and self.validate(task.result()):
+                        logger.info(f"{'Primary' if task is primary else 'Secondary'} model answered first")
+                        return task.result()
+                    logger.info(f"{'Primary' if task is primary else 'Secondary'} model gave no valid answer")
+                if secondary is None:
+                    logger.info(f"Hedging after {perf_counter() - start:.2f}s")
+                    secondary = create_task(self.secondary())
+                    pending.add(secondary)
+        finally:
+            # A primary cancelled still running took at least this long. Leaving it out would only keep the fast
+            # answers, and the delay would shrink until every request is hedged.
+            if primary in pending:
+                self.policy.record(perf_counter() - start)
+            for task in pending:
+                task.cancel()
+        raise GeminiError()
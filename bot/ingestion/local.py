@@ -0,0 +1,53 @@
+from importlib import import_module
+from logging import getLogger
+
+import numpy as np
+
+from api.models.match import Match, Team
+
+logger = getLogger("local")
+
+
+def team_problems(name: str, team: Team) -> list[str]:
+    problems = []
+    if len(team.players) != 5:
+        problems.append(f"{name} team has {len(team.players)} players")
+    for stat in ("kills", "deaths", "assists"):
+        players_total = sum(getattr(player.stats, stat) for player in team.players)
+        if players_total != getattr(team.stats, stat):
+            problems.append(f"{name} team {stat} {getattr(team.stats, stat)} != {players_total} from its players")
+    players_gold = sum(player.stats.gold_earned for player in team.players)
+    if players_gold != team.stats.total_gold:
+        problems.append(f"{name} team gold {team.stats.total_gold} != {players_gold} from its players")
+    for player in team.players:
+        if not 1 <= player.stats.level <= 18:
+            problems.append(f"{player.name} level {player.stats.level}")
+    return problems
+
+
+def match_problems(match: Match) -> list[str]:
+    """
+    Inconsistencies in a match read from a screenshot, a correct read has none
+    """
+    problems = team_problems("blue", match.blue_team) + team_problems("red", match.red_team)
+    # Every kill is a death on the other team, but executions by towers and minions are deaths without a kill
+    for team, other_team in ((match.blue_team, match.red_team), (match.red_team, match.blue_team)):
+        if team.stats.kills > other_team.stats.deaths:
+            problems.append(f"{team.stats.kills} kills but only {other_team.stats.deaths} deaths on the other team")
+    return problems
+
+
+def extract_match(image: np.ndarray, summoner_name: str) -> tuple[Match | None, list[str]]:
+    """
+    Read a match from a BGR screenshot with local OCR, from the point of view of the uploader's summoner.
+    Returns the match, or None when the scoreboard could not be parsed, and the problems found with it.
+    """
+    try:
+        # Local OCR dependencies are optional, only imported once local extraction is used
+        stats = import_module("bot.ingestion.stats")
+        match = stats.OCR(image).create_match(summoner_name)
+    except Exception as e:
+        # Whatever went wrong, e.g. an unexpected layout or a missing OCR dependency, the model still gets its turn
+        logger.exception("Local extraction failed")
+        return None, [f"could not parse the scoreboard: {e}"]
+    return match, match_problems(match)
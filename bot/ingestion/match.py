@@ -1,6 +1,7 @@
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from os import listdir
-from typing import Any, Literal
+from functools import lru_cache
+from typing import Any, Literal, NamedTuple
 
 import cv2
 from cv2 import Mat
@@ -8,6 +9,13 @@ import numpy as np
 
 from api.consts import Champion
 from bot import get_project_root
+from bot.ingestion.templates import TemplateBank, normalize_rows
+
+Engine = Literal["template", "vectorized"]
+
+# Portrait ROIs already found, by (height, width, side, factor, colors), see ImageRecognition.calculate_rois
+layout_cache: OrderedDict[tuple, tuple[tuple[int, int, int, int], ...]] = OrderedDict()
+max_layouts = 32
 
 generic_adjustments = {
     1: [(-1, 1, 0, -2)],
@@ -16,25 +24,56 @@ generic_adjustments = {
 }
 
 
+@lru_cache
+def color_tables(hex_colors: tuple[str, ...]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per channel (H, S, V) lookup tables where bit i of entry v is set when v is within color i's range
+
+    Each color keeps a range of +-15 hue and +-70 saturation and value around its HSV value.
+    """
+    if len(hex_colors) > 8:
+        raise ValueError("At most 8 colors fit in a uint8 lookup table")
+    # Convert hex to HSV
+    bgr_colors = [tuple(int(hex_color.lstrip("#")[i : i + 2], 16) for i in (4, 2, 0)) for hex_color in hex_colors]
+    hsv_colors = [cv2.cvtColor(np.uint8([[bgr_color]]), cv2.COLOR_BGR2HSV)[0][0] for bgr_color in bgr_colors]
+
+    values = np.arange(256, dtype=np.int32)[:, None]
+    tables = np.zeros((256, 3), dtype=np.uint8)
+    for bit, hsv_color in enumerate(hsv_colors):
+        hsv_color_int32 = hsv_color.astype(np.int32)
+        lower_bound = np.clip(hsv_color_int32 - [15, 70, 70], 0, 255)
+        upper_bound = np.clip(hsv_color_int32 + [15, 70, 70], 0, 255)
+        tables |= ((values >= lower_bound) & (values <= upper_bound)).astype(np.uint8) << bit
+    return tuple(np.ascontiguousarray(tables[:, channel]) for channel in range(3))
+
+
+class RoiMatch(NamedTuple):
+    champion: Champion | None
+    confidence: float
+    growth: int  # pixels added to the ROI width and height
+    evaluations: int = 1
+
+
 @dataclass
 class ImageRecognition:
-    original_champions_images: dict[str, np.ndarray] = field(default_factory=dict)
-    champion_images: dict[str, np.ndarray] = field(default_factory=dict)
-    ban_images: dict[str, np.ndarray] = field(default_factory=dict)
+    champion_bank: TemplateBank = field(default_factory=TemplateBank)
+    ban_bank: TemplateBank = field(default_factory=TemplateBank)
     adjustments: dict[int, tuple[int, int, int, int]] = field(default_factory=dict)
     screenshot: Mat | np.ndarray[Any, np.dtype] = None
+    engine: Engine = "template"
+    max_growth: int = 16  # max pixels an unmatched ROI can grow by
+    max_evaluations: int = 8  # max matches to spend on an unmatched ROI
+    use_layout_cache: bool = True
+    ban_inset: float = 0.1  # fraction of a ban ROI trimmed on each side to drop the gray frame
+    min_ban_confidence: float = 0.5  # real bans score 0.65+, anything below is a gray box that is not a ban
+    shortlist: int | None = 20  # only correlate the N templates with the closest dHash, None scores all
+    roi_matches: list[RoiMatch] = field(default_factory=list)
     debug: bool = False
 
     def __post_init__(self):
-        for _image in listdir(f"{get_project_root()}/bot/ingestion/champions"):
-            self.original_champions_images[_image.split(".")[0]] = cv2.imread(
-                f"{get_project_root()}/bot/ingestion/champions/{_image}"
-            )
-
-        for _image in listdir(f"{get_project_root()}/bot/ingestion/champions2"):
-            self.champion_images[_image.split(".")[0]] = cv2.imread(
-                f"{get_project_root()}/bot/ingestion/champions2/{_image}"
-            )
+        self.champion_bank = TemplateBank.from_atlas("champions2")
+        # Bans show the square icon, crossed out, inside a gray frame
+        self.ban_bank = TemplateBank.from_atlas("champions")
 
         self.adjustments = {
             1: (-2, 2, 2, 0),  # (-1, 1, 0, -2)
@@ -46,17 +85,18 @@ class ImageRecognition:
 
     # Function to match template and return champion name
     @staticmethod
-    def match_champion(image: Mat | np.ndarray[Any, np.dtype], template_dict) -> Champion | None:
+    def match_champion(
+        image: Mat | np.ndarray[Any, np.dtype], bank: TemplateBank, shortlist: int | None = None
+    ) -> tuple[Champion | None, float]:
         best_match = None
         highest_val = 0
-        # Resize the image if needed
-        for champ, template in template_dict.items():
-            _template = cv2.resize(template, (image.shape[1], image.shape[0]))
-
-            # Normalize the images to minimize lighting differences
-            image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            template_gray = cv2.cvtColor(_template, cv2.COLOR_BGR2GRAY)
-
+        # Normalize the image to minimize lighting differences, templates are already grayscale
+        image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        templates = bank.resized(image.shape[1], image.shape[0])
+        if shortlist is not None:
+            names = bank.names
+            templates = {names[index]: templates[names[index]] for index in bank.shortlist(image_gray, shortlist)}
+        for champ, template_gray in templates.items():
             res = cv2.matchTemplate(image_gray, template_gray, cv2.TM_CCOEFF_NORMED)
             min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
 
@@ -64,80 +104,133 @@ class ImageRecognition:
                 highest_val = max_val
                 best_match: Champion | None = champ
 
-        return best_match
+        return best_match, float(highest_val)
 
-    def get_raw_champions(
-        self, rois: list[tuple[int, int, int, int]], images: dict[str, np.ndarray]
-    ) -> list[Champion | None]:
-        # Iterate over each ROI to identify champions
-        identified_champions = []
-
-        for index, roi in enumerate(rois):
-            x, y, w, h = roi
-            roi_image = self.screenshot[y : y + h, x : x + w]
-            champion = self.match_champion(roi_image, images)
-            if champion == "MonkeyKing":
-                champion = "Wukong"
-            increment = 1
-            while champion is None:
-                roi_image = self.screenshot[y : y + h + increment, x : x + w + increment]
-                if self.debug:
-                    height, width = self.screenshot.shape[:2]
-                    crop = self.screenshot[0:height, 0 : int(width * 0.2)]
-                    cv2.rectangle(crop, (x, y), (x + w + increment, y + h + increment), (255, 255, 0), 2)
-                    cv2.imshow("Detected ROIs", crop)
-                    cv2.waitKey(0)
-                    cv2.destroyAllWindows()
-                champion: Champion | None = self.match_champion(roi_image, self.champion_images)
-                if champion:
-                    break
-                increment += 1
-            identified_champions.append(champion)
-        return identified_champions
+    @staticmethod
+    def match_champions(
+        images: list[Mat | np.ndarray[Any, np.dtype]], bank: TemplateBank, shortlist: int | None = None
+    ) -> list[tuple[Champion | None, float]]:
+        # Same result as match_champion, but every ROI of the same size is scored against
+        # every template with a single matrix multiply
+        names = bank.names
+        best_matches: list[tuple[Champion | None, float]] = [(None, 0.0)] * len(images)
+        by_size: dict[tuple[int, int], list[int]] = {}
+        for index, image in enumerate(images):
+            by_size.setdefault((image.shape[1], image.shape[0]), []).append(index)
+
+        for (width, height), indexes in by_size.items():
+            grays = [cv2.cvtColor(images[index], cv2.COLOR_BGR2GRAY) for index in indexes]
+            rois = normalize_rows(np.stack([gray.ravel() for gray in grays]))
+            matrix = bank.matrix(width, height)
+            if shortlist is None:
+                scores = rois @ matrix.T
+                candidates = np.broadcast_to(np.arange(len(names)), scores.shape)
+            else:
+                # Only score the templates whose dHash is closest to each ROI's
+                candidates = np.stack([bank.shortlist(gray, shortlist) for gray in grays])
+                scores = np.einsum("rcp,rp->rc", matrix[candidates], rois)
+            best = scores.argmax(axis=1)
+            for row, index in enumerate(indexes):
+                if scores[row, best[row]] > 0:
+                    best_matches[index] = (names[candidates[row, best[row]]], float(scores[row, best[row]]))
+        return best_matches
+
+    def match(
+        self, images: list[Mat | np.ndarray[Any, np.dtype]], bank: TemplateBank
+    ) -> list[tuple[Champion | None, float]]:
+        if self.engine == "vectorized":
+            return self.match_champions(images, bank, self.shortlist)
+        return [self.match_champion(image, bank, self.shortlist) for image in images]
+
+    def search_champion(self, roi: tuple[int, int, int, int], bank: TemplateBank) -> RoiMatch:
+        """
+        Grow the crop of an ROI that had no match, coarse to fine, with a fixed budget of evaluations.
+
+        The coarse pass doubles the growth (1, 2, 4, ... up to max_growth pixels), the fine pass then tries the
+        growths around the best coarse one, nearest first, until max_evaluations is spent.
+        """
+        x, y, w, h = roi
+        best = RoiMatch(None, 0.0, 0)
+        evaluated = set()
+
+        def evaluate(growth: int) -> None:
+            nonlocal best
+            evaluated.add(growth)
+            champion, confidence = self.match([self.screenshot[y : y + h + growth, x : x + w + growth]], bank)[0]
+            if champion is not None and confidence > best.confidence:
+                best = RoiMatch(champion, confidence, growth)
+
+        growth = 1
+        while growth <= self.max_growth and len(evaluated) < self.max_evaluations:
+            evaluate(growth)
+            growth *= 2
+
+        if best.champion is not None:
+            lower, upper = max(best.growth // 2, 1), min(best.growth * 2, self.max_growth)
+            candidates = sorted(
+                (growth for growth in range(lower, upper + 1) if growth not in evaluated),
+                key=lambda _growth: abs(_growth - best.growth),
+            )
+            for growth in candidates[: self.max_evaluations - len(evaluated)]:
+                evaluate(growth)
 
-    def calculate_rois(
-        self, side: Literal["left", "right"] = "left", factor: float = 0.2, hex_colors: list[str] = None
-    ) -> list[tuple[int, int, int, int]]:
-        # Define the region on the left side where the portraits are located
-        height, width = self.screenshot.shape[:2]
+        if self.debug:
+            height, width = self.screenshot.shape[:2]
+            crop = self.screenshot[0:height, 0 : int(width * 0.2)]
+            cv2.rectangle(crop, (x, y), (x + w + best.growth, y + h + best.growth), (255, 255, 0), 2)
+            cv2.imshow("Detected ROIs", crop)
+            cv2.waitKey(0)
+            cv2.destroyAllWindows()
+        return RoiMatch(best.champion, best.confidence, best.growth, len(evaluated))
 
-        if side == "left":
-            crop = self.screenshot[0:height, 0 : int(width * factor)]
-        else:
-            crop = self.screenshot[0:height, int(width * (1 - factor)) : width]
+    def get_raw_champions(self, rois: list[tuple[int, int, int, int]], bank: TemplateBank) -> list[Champion | None]:
+        # Iterate over each ROI to identify champions
+        self.roi_matches = []
+        roi_images = [self.screenshot[y : y + h, x : x + w] for x, y, w, h in rois]
+
+        for roi, (champion, confidence) in zip(rois, self.match(roi_images, bank)):
+            roi_match = RoiMatch(champion, confidence, 0)
+            if champion is None:
+                roi_match = self.search_champion(roi, bank)
+            if roi_match.champion == "MonkeyKing":
+                roi_match = RoiMatch("Wukong", roi_match.confidence, roi_match.growth, roi_match.evaluations)
+            self.roi_matches.append(roi_match)
+        return [roi_match.champion for roi_match in self.roi_matches]
+
+    def layout_matches(
+        self, crop: Mat | np.ndarray[Any, np.dtype], rois: list[tuple[int, int, int, int]], hex_colors: list[str]
+    ) -> bool:
+        # Check of a cached layout as strict as its detection: each ROI is the bounding rectangle of a border contour,
+        # so each of its four edges holds border pixels and the one pixel ring around it holds none.
+        # Any shift or resize by a pixel breaks one of the two.
+        for x, y, w, h in rois:
+            top, left = max(y - 1, 0), max(x - 1, 0)
+            window = crop[top : y + h + 1, left : x + w + 1]
+            mask = self.color_mask(cv2.cvtColor(window, cv2.COLOR_BGR2HSV), hex_colors) > 0
+            inside = mask[y - top : y - top + h, x - left : x - left + w]
+            if inside.shape != (h, w) or np.count_nonzero(mask) != np.count_nonzero(inside):
+                return False
+            if not (inside[0].any() and inside[-1].any() and inside[:, 0].any() and inside[:, -1].any()):
+                return False
+        return True
 
+    @staticmethod
+    def color_mask(hsv_image: Mat | np.ndarray[Any, np.dtype], hex_colors: list[str]) -> np.ndarray:
+        # One lookup per channel classifies every pixel against all colors at once,
+        # a pixel is in the mask when the three channels share a color bit
+        hue, saturation, value = cv2.split(hsv_image)
+        hue_table, saturation_table, value_table = color_tables(tuple(hex_colors))
+        combined_mask = cv2.LUT(hue, hue_table, dst=hue)
+        cv2.bitwise_and(combined_mask, cv2.LUT(saturation, saturation_table, dst=saturation), dst=combined_mask)
+        cv2.bitwise_and(combined_mask, cv2.LUT(value, value_table, dst=value), dst=combined_mask)
+        return cv2.compare(combined_mask, 0, cv2.CMP_GT)
+
+    def detect_rois(
+        self, crop: Mat | np.ndarray[Any, np.dtype], hex_colors: list[str]
+    ) -> list[tuple[int, int, int, int]]:
         # Convert the cropped left side of the image from BGR to HSV color space
         hsv_image = cv2.cvtColor(crop, cv2.COLOR_BGR2HSV)
-
-        if hex_colors is None:
-            hex_colors = ["#eec133", "#846f36", "#8c7332", "#deb533"]
-
-        # Convert hex to HSV
-        bgr_colors = [tuple(int(hex_color.lstrip("#")[i : i + 2], 16) for i in (4, 2, 0)) for hex_color in hex_colors]
-        hsv_colors = [cv2.cvtColor(np.uint8([[bgr_color]]), cv2.COLOR_BGR2HSV)[0][0] for bgr_color in bgr_colors]
-
-        # Create masks for each color with a broader range
-        masks = []
-        for hsv_color in hsv_colors:
-            hsv_color_int32 = hsv_color.astype(np.int32)
-
-            lower_bound = np.array(
-                [hsv_color_int32[0] - 15, hsv_color_int32[1] - 70, hsv_color_int32[2] - 70], dtype=np.int32
-            )
-            upper_bound = np.array(
-                [hsv_color_int32[0] + 15, hsv_color_int32[1] + 70, hsv_color_int32[2] + 70], dtype=np.int32
-            )
-
-            lower_bound = np.clip(lower_bound, 0, 255).astype(np.uint8)
-            upper_bound = np.clip(upper_bound, 0, 255).astype(np.uint8)
-
-            mask = cv2.inRange(hsv_image, lower_bound, upper_bound)
-            masks.append(mask)
-
-        # Combine all masks (using bitwise OR)
-        combined_mask = masks[0]
-        for mask in masks[1:]:
-            combined_mask = cv2.bitwise_or(combined_mask, mask)
+        combined_mask = self.color_mask(hsv_image, hex_colors)
 
         # Display the combined mask for debugging
         # cv2.imshow("Combined Mask (HSV)", combined_mask)
@@ -167,8 +260,39 @@ class ImageRecognition:
             x, y, w, h = contour
             if w + 5 < max_width or h + 5 < max_height:
                 continue
-            cv2.rectangle(crop, (x, y), (x + w, y + h), (0, 255, 0), 2)
             final_rois.append((x, y, w, h))
+        final_rois.reverse()
+        return final_rois
+
+    def calculate_rois(
+        self, side: Literal["left", "right"] = "left", factor: float = 0.2, hex_colors: list[str] = None
+    ) -> list[tuple[int, int, int, int]]:
+        # Define the region on the left side where the portraits are located
+        height, width = self.screenshot.shape[:2]
+
+        if side == "left":
+            crop = self.screenshot[0:height, 0 : int(width * factor)]
+        else:
+            crop = self.screenshot[0:height, int(width * (1 - factor)) : width]
+
+        if hex_colors is None:
+            hex_colors = ["#eec133", "#846f36", "#8c7332", "#deb533"]
+
+        # Screenshots come from a handful of client resolutions, reuse the layout found for this geometry
+        # as long as its portrait borders are still where we expect them
+        key = (height, width, side, factor, tuple(hex_colors))
+        final_rois = layout_cache.get(key) if self.use_layout_cache else None
+        if final_rois is not None and self.layout_matches(crop, final_rois, hex_colors):
+            layout_cache.move_to_end(key)
+        else:
+            final_rois = tuple(self.detect_rois(crop, hex_colors))
+            if self.use_layout_cache and final_rois:
+                layout_cache[key] = final_rois
+                if len(layout_cache) > max_layouts:
+                    layout_cache.popitem(last=False)
+
+        for x, y, w, h in final_rois:
+            cv2.rectangle(crop, (x, y), (x + w, y + h), (0, 255, 0), 2)
         if self.debug:
             print(final_rois)
 
@@ -177,12 +301,73 @@ class ImageRecognition:
             cv2.imshow("Detected ROIs", crop)
             cv2.waitKey(0)
             cv2.destroyAllWindows()
-        final_rois.reverse()
-        return final_rois
+        return list(final_rois)
 
     def get_champions(self) -> list[Champion | None]:
         _rois = self.calculate_rois()
-        return self.get_raw_champions(_rois, self.champion_images)
+        return self.get_raw_champions(_rois, self.champion_bank)
+
+    def calculate_ban_rois(
+        self, portraits: list[tuple[int, int, int, int]], factor: float = 0.2
+    ) -> tuple[list[tuple[int, int, int, int]], list[tuple[int, int, int, int]]]:
+        # Bans sit on the right side, in a 3 column grid per team, framed in gray (#5c5b57).
+        # Gray has no stable hue, so look for dark, unsaturated pixels instead of a hue range
+        height, width = self.screenshot.shape[:2]
+        offset = int(width * (1 - factor))
+        hsv_image = cv2.cvtColor(self.screenshot[0:height, offset:width], cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv_image, np.uint8([0, 0, 60]), np.uint8([180, 50, 150]))
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        # Bans are about the size of a portrait and between the first and last portrait rows
+        size = max(portrait[2] for portrait in portraits)
+        top, bottom = portraits[0][1] - size, portraits[-1][1] + size
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if 0.8 < w / float(h) < 1.25 and 0.6 * size < w < 1.4 * size and top < y < bottom:
+                boxes.append((x + offset, y, w, h))
+
+        # The frame is drawn as two shifted triangles, merge the boxes that overlap into one ban
+        bans = []
+        for x, y, w, h in sorted(boxes):
+            for index, (ban_x, ban_y, ban_w, ban_h) in enumerate(bans):
+                overlap_w = min(x + w, ban_x + ban_w) - max(x, ban_x)
+                overlap_h = min(y + h, ban_y + ban_h) - max(y, ban_y)
+                if overlap_w > 0 and overlap_h > 0 and overlap_w * overlap_h > 0.4 * min(w * h, ban_w * ban_h):
+                    left, upper = min(x, ban_x), min(y, ban_y)
+                    bans[index] = (
+                        left,
+                        upper,
+                        max(x + w, ban_x + ban_w) - left,
+                        max(y + h, ban_y + ban_h) - upper,
+                    )
+                    break
+            else:
+                bans.append((x, y, w, h))
+
+        # Red team bans start below the gap between the 5th and 6th portraits, read each grid row by row
+        split = (portraits[4][1] + portraits[5][1]) / 2 if len(portraits) >= 6 else height / 2
+        bans.sort(key=lambda ban: (round(ban[1] / size), ban[0]))
+        return [ban for ban in bans if ban[1] < split], [ban for ban in bans if ban[1] >= split]
+
+    def get_bans(
+        self, portraits: list[tuple[int, int, int, int]] | None = None
+    ) -> tuple[list[Champion], list[Champion]]:
+        if portraits is None:
+            portraits = self.calculate_rois()
+        teams = []
+        for rois in self.calculate_ban_rois(portraits):
+            images = []
+            for x, y, w, h in rois:
+                inset_x, inset_y = round(w * self.ban_inset), round(h * self.ban_inset)
+                images.append(self.screenshot[y + inset_y : y + h - inset_y, x + inset_x : x + w - inset_x])
+            bans = [
+                champion
+                for champion, confidence in self.match(images, self.ban_bank)
+                if champion is not None and confidence >= self.min_ban_confidence
+            ]
+            teams.append(["Wukong" if champion == "MonkeyKing" else champion for champion in bans])
+        return teams[0], teams[1]
 
 
 if __name__ == "__main__":
@@ -190,6 +375,4 @@ if __name__ == "__main__":
     img_recognition.set_screenshot(cv2.imread(f"{get_project_root()}/tests/data/test16.png"))
     champions = img_recognition.get_champions()
     print(champions)
-    # print(img_recognition.calculate_rois("right", 0.7, ["#5c5b57"]))
-    # print(img_recognition.get_raw_champions(img_recognition.calculate_rois("right", 0.2, ["#5c5b57"]),
-    #                                         img_recognition.ban_images))
+    print(img_recognition.get_bans())
@@ -1,4 +1,4 @@
-from functools import lru_cache
+from functools import lru_cache, partial
 from pprint import pprint
 from re import search
 from typing import Any
@@ -7,27 +7,59 @@ import cv2
 from cv2 import Mat
 from dateparser import parse
 import numpy as np
-from numpy import array, dtype, ndarray
-from PIL import Image, ImageEnhance
-from pytesseract import image_to_string
+from numpy import dtype, ndarray
+from pytesseract import Output, image_to_data, image_to_string
 from rapidocr_onnxruntime import RapidOCR
 
 from api.models.match import Match
 from bot import get_project_root
+from bot.consts import ocr_engines, ocr_inter_op_threads, ocr_intra_op_threads
+from bot.ingestion.digits import GlyphClassifier, number_crops, scoreboard_gray, split_words, stitch_crops
+from bot.ingestion.engine_pool import EnginePool
+from bot.ingestion.text_lines import pack_text_lines
 from bot.utils import remove_accents
 
+# Single line of digits, for a strip of stitched number crops
+digits_line_config = r"--psm 7 -c tessedit_char_whitelist=0123456789"
+
+
+def warm_up_image() -> ndarray:
+    # Some text, so both detection and recognition models run during warm-up
+    image = np.full((64, 320, 3), 255, np.uint8)
+    cv2.putText(image, "Custom 25:13 12/3/4", (8, 42), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 0), 2)
+    return image
+
 
 @lru_cache
-def get_engine() -> RapidOCR:
-    return RapidOCR()
+def get_engine_pool() -> EnginePool:
+    # RapidOCR copies its global thread settings to the detection, classification and recognition sessions
+    factory = partial(RapidOCR, intra_op_num_threads=ocr_intra_op_threads, inter_op_num_threads=ocr_inter_op_threads)
+    return EnginePool(factory, size=ocr_engines, warm_up_input=warm_up_image())
+
+
+@lru_cache
+def get_glyph_classifier() -> GlyphClassifier:
+    return GlyphClassifier.from_folder()
 
 
 class OCR:
-    def __init__(self, image: Mat | ndarray[Any, dtype] | ndarray | str):
+    def __init__(
+        self,
+        image: Mat | ndarray[Any, dtype] | ndarray | str,
+        batch_digits: bool = True,
+        use_glyphs: bool = True,
+        pack_lines: bool = True,
+    ):
         self.image_path = None
+        self.batch_digits = batch_digits
+        self.use_glyphs = use_glyphs
+        self.pack_lines = pack_lines
         if isinstance(image, str):
             self.image_path = image
-        self.image = image
+        # BGR screenshot, read once
+        self.image: ndarray = cv2.imread(image) if isinstance(image, str) else image
+        # Grayscale screenshot with team 2's red text turned white, see change_team2_color
+        self.gray: ndarray | None = None
         self.team_2_stats: dict[str, str] | None = None
         # img_recognition = ImageRecognition()
         # img_recognition.set_screenshot(cv2.imread(self.image_path) if self.image_path else self.image)
@@ -36,155 +68,65 @@ class OCR:
         # self.champions = champions
 
     @staticmethod
-    def get_general_stats_rois(image):
-        # Load the image
-        image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-        # Show grayscale image for debugging
-        # cv2.imshow("Grayscale Image", gray)
-        # cv2.waitKey(0)
-
-        # Apply binary thresholding (You might need to adjust the threshold value)
-        _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
-
-        # Show threshold image for debugging
-        # cv2.imshow("Threshold Image", thresh)
-        # cv2.waitKey(0)
-
-        # Find contours
-        contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-
-        rois = []
-
-        # Loop over contours
-        for i, contour in enumerate(contours):
-            x, y, w, h = cv2.boundingRect(contour)
-
-            if 10 < h < 150 and 15 < w < 150 and 0.2 < w / h < 2.0:
-                roi = [x - 15, y - 20, w + 30, h + 40]
-                if rois:
-                    if abs(rois[-1][0] - x) < 50:
-                        rois[-1] = [x - 5, rois[-1][1], rois[-1][2] + w + 10, rois[-1][3]]
-                        # Green for detected digits
-                        cv2.rectangle(
-                            image, (rois[-1][0], rois[-1][1]), (rois[-1][0] + w, rois[-1][1] + h), (0, 255, 0), 2
-                        )
-                    else:
-                        # Store ROI coordinates
-                        rois.append(roi)
-                        # Green for detected digits
-                        cv2.rectangle(image, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                else:
-                    rois.append(roi)
-                    cv2.rectangle(image, (x, y), (x + w, y + h), (0, 255, 0), 2)
-
-        # Sort ROIs by their x-coordinate (from left to right)
-        rois = sorted(rois, key=lambda b: b[0])
-
-        # Display the image with detected ROIs
-        # cv2.imshow("Digits with ROIs", image)
-        # cv2.waitKey(0)
-        # cv2.destroyAllWindows()
-        rois = map(lambda _roi: (_roi[0] - 4, _roi[1] - 4, _roi[2] + 10, _roi[3] + 10), rois)
-
-        return rois
+    def enhance_contrast(gray: ndarray, factor: float) -> ndarray:
+        # PIL's ImageEnhance.Contrast, in place: move every pixel towards (factor < 1) or away from the mean
+        mean = int(gray.mean() + 0.5)
+        return cv2.addWeighted(gray, factor, gray, 0, mean * (1 - factor), dst=gray)
 
     @staticmethod
-    def preprocess_image(img) -> ndarray:
-        # Convert to grayscale
-        img = img.convert("L")
-
-        # Increase contrast
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(0.1)
-
-        # Resize if necessary (optional)
-        img = img.resize((img.width * 2, img.height * 2))
-
-        # Convert to NumPy array
-        img_array = array(img)
-        # cv_image = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-        # for roi in self.rois:
-        #     x, y, w, h = roi
-        #     cv2.rectangle(cv_image, (x, y), (x + w, y + h), (0, 255, 0), 2)
-        # cv2.imshow("Detected ROIs", img_array)
-        # cv2.waitKey(0)
-        # cv2.destroyAllWindows()
+    def preprocess_image(gray: ndarray) -> ndarray:
+        # Lower contrast, in place, then upscale
+        OCR.enhance_contrast(gray, 0.1)
+        return cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
 
-        return img_array
-
-    def change_team2_color(self):
-        # Load image using OpenCV for color processing
-        img = self.image if not isinstance(self.image, str) else cv2.imread(self.image)
-
-        # Define the color range for Team 2 (red team)
-        lower_red = np.array([0, 0, 100])
-        upper_red = np.array([50, 27, 255])
+    @staticmethod
+    def preprocess_text_lines(gray: ndarray) -> ndarray:
+        # Only the text segments, already on a dark background, so no contrast change, then upscale.
+        # 1.75x reads as well as 2x, the detector runs over every pixel of the packed image and 2x costs it half more
+        return cv2.resize(pack_text_lines(gray), None, fx=1.75, fy=1.75, interpolation=cv2.INTER_CUBIC)
 
-        # Find the red color in the image (Team 2's color)
-        mask = cv2.inRange(img, lower_red, upper_red)
+    @staticmethod
+    def preprocess_number(number_image: ndarray) -> ndarray:
+        # Thresholds the crop in place, only call it once the crop is not needed as it was
+        OCR.enhance_contrast(number_image, 1.5)
 
-        # Change the red areas (Team 2) to a color similar to Team 1's color (blue team)
-        img[mask > 0] = [255, 255, 255]  # Example: Change to white (adjust this as needed)
+        # Simple global thresholding
+        cv2.threshold(number_image, 150, 255, cv2.THRESH_BINARY, dst=number_image)
 
-        # cv2.imshow("Mask", img)
-        # cv2.waitKey(0)
-        # cv2.destroyAllWindows()
+        # Sharpen the image using a kernel
+        kernel_sharpening = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
+        return cv2.filter2D(number_image, -1, kernel_sharpening)
 
-        # Convert the processed image back to PIL Image
-        processed_img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    @staticmethod
+    def read_numbers(images: list[ndarray]) -> list[str]:
+        # One Tesseract process for all the crops, instead of one per crop
+        if not images:
+            return []
+        strip, starts = stitch_crops(images)
+        words = image_to_data(strip, config=digits_line_config, output_type=Output.DICT)
+        return split_words(words, starts, len(images))
 
-        # Update the image attribute to the new processed image
-        self.image = processed_img
+    def change_team2_color(self) -> None:
+        self.gray = scoreboard_gray(self.image)
 
     def change_team2_color_v2(self):
-        # Load image using OpenCV for color processing
-        img = self.image if not isinstance(self.image, str) else cv2.imread(self.image)
-
         # Convert image to HSV color space
-        hsv_img = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-
-        # Define the color range for red in HSV
-        lower_red1 = np.array([0, 50, 50])
-        upper_red1 = np.array([10, 255, 255])
-        lower_red2 = np.array([170, 50, 50])
-        upper_red2 = np.array([180, 255, 255])
-
-        # Create masks to isolate red regions
-        mask1 = cv2.inRange(hsv_img, lower_red1, upper_red1)
-        mask2 = cv2.inRange(hsv_img, lower_red2, upper_red2)
-        mask = cv2.bitwise_or(mask1, mask2)
-
-        # Convert the red areas to black text on white background
-        result = cv2.bitwise_not(mask)
+        hsv_img = cv2.cvtColor(self.image, cv2.COLOR_BGR2HSV)
 
-        # Convert result to 3-channel BGR for consistency
-        result_bgr = cv2.cvtColor(result, cv2.COLOR_GRAY2BGR)
+        # Isolate red regions, red hue wraps around 180
+        mask = cv2.inRange(hsv_img, np.array([0, 50, 50]), np.array([10, 255, 255]))
+        mask |= cv2.inRange(hsv_img, np.array([170, 50, 50]), np.array([180, 255, 255]))
 
-        # Apply a slight blur to reduce noise
-        blurred_result = cv2.GaussianBlur(result_bgr, (3, 3), 0)
+        # Black text on a white background, with a slight blur to reduce noise
+        cv2.bitwise_not(mask, dst=mask)
+        cv2.GaussianBlur(mask, (3, 3), 0, dst=mask)
 
-        # Convert to grayscale
-        gray_result = cv2.cvtColor(blurred_result, cv2.COLOR_BGR2GRAY)
+        # Increase contrast, then sharpen, like PIL's ImageEnhance.Sharpness(2.0): twice the image minus its smoothing
+        self.enhance_contrast(mask, 2.0)
+        kernel_sharpening = -np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], np.float32) / 13
+        kernel_sharpening[1, 1] += 2
+        final_image_cv = cv2.filter2D(mask, -1, kernel_sharpening)
 
-        # Increase contrast
-        contrast_enhancer = ImageEnhance.Contrast(Image.fromarray(gray_result))
-        contrasted_image = contrast_enhancer.enhance(2.0)  # Adjust the contrast as needed
-
-        # Sharpen the image
-        sharpen_enhancer = ImageEnhance.Sharpness(contrasted_image)
-        sharpened_image = sharpen_enhancer.enhance(2.0)  # Adjust sharpness as needed
-
-        # Convert back to NumPy array for OpenCV
-        final_image_cv = np.array(sharpened_image)
-
-        # Display the processed image for debugging
-        # cv2.imshow("Enhanced Image for OCR", final_image_cv)
-        # cv2.waitKey(0)
-        # cv2.destroyAllWindows()
         # Configure Tesseract to use only digits and slashes
         custom_config = r"--psm 7 -c tessedit_char_whitelist=0123456789/ "
         result = image_to_string(final_image_cv, config=custom_config)
@@ -201,82 +143,52 @@ class OCR:
     def get_text(self) -> tuple[list[str], list[str], list[str]]:
         self.change_team2_color_v2()
         self.change_team2_color()
-        # Get the dimensions of the image
-        width, height = self.image.size
-
-        # Crop the left part of the image (0% to 80% of the width)
-        left = self.image.crop((0, 0, int(width * 0.75), height))
-
-        right = self.image.crop((int(width * 0.8), int(0.3 * height), width, (int(height * 0.9))))
-
-        right = right.resize((right.width * 3, right.height * 3))
-
-        right_upper = right.crop((0, int(right.height * 0.3), right.width, int(right.height * 0.45)))
-        right_lower = right.crop((0, int(right.height * 0.80), right.width, right.height))
-        # Increase contrast
-        # enhancer = ImageEnhance.Contrast(right_lower)
-        # right_lower = enhancer.enhance(2)
-
-        # Debugging: Display the cropped images
-        # right_upper.show()
-        # right_lower.show()
-
-        right_upper_rois = self.get_general_stats_rois(right_upper)
-        right_lower_rois = self.get_general_stats_rois(right_lower)
+        width = self.gray.shape[1]
 
-        numbers_images = {
-            "blue": [],
-            "red": [],
-        }
+        # The left part of the image (0% to 75% of the width), a view, preprocessing only touches these columns
+        left = self.gray[:, : int(width * 0.75)]
 
-        for roi in right_upper_rois:
-            x, y, w, h = roi
-            numbers_images["blue"].append(right_upper.crop((x, y, x + w, y + h)))
+        numbers_images = self.get_numbers_images()
 
-        for roi in right_lower_rois:
-            x, y, w, h = roi
-            # right_lower.crop((x, y, x + w, y + h)).show()
-            numbers_images["red"].append(right_lower.crop((x, y, x + w, y + h)))
-
-        results, elapse = get_engine()(self.preprocess_image(left))
+        # One engine call either way, over the packed text lines it sees a fraction of the pixels
+        image = self.preprocess_text_lines(left) if self.pack_lines else self.preprocess_image(left)
+        results, elapse = get_engine_pool()(image)
         text_list_left = []
         for result in results:
             for text in result:
                 if isinstance(text, str):
                     text_list_left.append(text)
-        numbers_blue = []
-        for number_image in numbers_images["blue"]:
-            # Convert to grayscale
-            grayscale_image = number_image.convert("L")
-
-            # Optionally, increase contrast if needed
-            contrast_enhancer = ImageEnhance.Contrast(grayscale_image)
-            enhanced_image = contrast_enhancer.enhance(1.5)  # Adjust contrast factor slightly
-
-            # Convert to NumPy array for OpenCV processing
-            image_cv = np.array(enhanced_image)
-
-            # Simple global thresholding
-            _, thresholded_image = cv2.threshold(image_cv, 150, 255, cv2.THRESH_BINARY)
-
-            # Optional: Sharpen the image using a kernel
-            kernel_sharpening = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
-            sharpened_image = cv2.filter2D(thresholded_image, -1, kernel_sharpening)
-            # cv2.imshow("Cleaned Image", sharpened_image)
-            # cv2.waitKey(0)
-            # cv2.destroyAllWindows()
-            result: str = image_to_string(sharpened_image, config="--psm 8 digits")
-            numbers_blue.append(result.strip())
-
-        numbers_red = []
-        for number_image in numbers_images["red"]:
-            result: str = image_to_string(number_image, config="--psm 8 digits")
-            numbers_red.append(result.strip())
-
-        # print(image_to_string(self.preprocess_image(left)))
+        numbers_blue = self.read_team_numbers("blue", numbers_images["blue"])
+        numbers_red = self.read_team_numbers("red", numbers_images["red"])
 
         return text_list_left, numbers_blue, numbers_red
 
+    def get_numbers_images(self) -> dict[str, list[ndarray]]:
+        return number_crops(self.gray)
+
+    def read_team_numbers(self, team: str, number_images: list[ndarray]) -> list[str]:
+        numbers: list[str | None] = [None] * len(number_images)
+        if self.use_glyphs:
+            # The numbers use a fixed game font, read them in process and only send unsure crops to Tesseract
+            classifier = get_glyph_classifier()
+            numbers = [classifier.read(number_image) for number_image in number_images]
+        fallback = [index for index, number in enumerate(numbers) if number is None]
+        if not fallback:
+            return numbers
+
+        images = [number_images[index] for index in fallback]
+        # Blue crops read better thresholded and sharpened, red ones as they are
+        if team == "blue":
+            images = [self.preprocess_number(image) for image in images]
+        if self.batch_digits:
+            # Blue and red crops are preprocessed differently, so each team gets its own strip
+            texts = self.read_numbers(images)
+        else:
+            texts = [image_to_string(image, config="--psm 8 digits").strip() for image in images]
+        for index, text in zip(fallback, texts):
+            numbers[index] = text
+        return numbers
+
     def create_match(self, summoner_name: str) -> Match:
         summoner_name = remove_accents(summoner_name)
         text_list_left, numbers_blue, numbers_red = self.get_text()
@@ -305,12 +217,20 @@ class OCR:
                 if team == "blue"
                 else (self.team_2_stats["kills"], self.team_2_stats["deaths"], self.team_2_stats["assists"])
             )
+            # The team's gold follows its KDA, skipping the crossed swords icon when it was read as text
+            total_gold = next(
+                (value for value in text_list_left[find_team + 2 : find_team + 4] if value.replace(",", "").isdigit()),
+                None,
+            )
+            if total_gold is None:
+                # A StopIteration would escape the worker thread, this becomes one of the extraction's problems
+                raise ValueError(f"{team} team gold not found after its KDA")
             fields[f"{team}_team"] = {
                 "stats": {
                     "kills": kills,
                     "deaths": deaths,
                     "assists": assists,
-                    "total_gold": int(text_list_left[find_team + 2].replace(",", "")),
+                    "total_gold": int(total_gold.replace(",", "")),
                 },
             }
             fields[f"{team}_team"]["players"] = []
@@ -348,6 +268,7 @@ class OCR:
                     sub_index += 1
                 player = {
                     "name": name,
+                    "discord_id": None,
                     "picked_champion": None,
                     "stats": {
                         "level": level,
@@ -382,8 +303,10 @@ class OCR:
         #     for player in fields[f"{team}_team"]["players"]:
         #         player["picked_champion"] = self.champions.pop(0)
         label_winning = "victory" if "victory".upper() in text_list_left else "defeat"
-        if summoner_name in [player["name"] for player in fields["blue_team"]["players"]]:
-            fields["winner"] = "blue" if label_winning == "victory" else "red"
+        # The label is from the uploader's point of view, a summoner on neither team leaves winner unset and invalid
+        for team, other_team in (("blue", "red"), ("red", "blue")):
+            if summoner_name in [player["name"] for player in fields[f"{team}_team"]["players"]]:
+                fields["winner"] = team if label_winning == "victory" else other_team
         return Match(**fields)
 
 
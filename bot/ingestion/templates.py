@@ -0,0 +1,184 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from json import dump, load
+from os import fdopen, listdir, makedirs, replace, stat
+from os.path import exists
+from tempfile import mkstemp
+
+import cv2
+import numpy as np
+
+from api.consts import Champion
+from bot import get_project_root
+from bot.consts import atlas_folder
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    # Zero-mean, unit-norm rows, so a dot product between two rows is their Pearson correlation,
+    # the same value cv2.TM_CCOEFF_NORMED gives for an image and a template of equal size
+    vectors = vectors.astype(np.float32)
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    # Flat rows have no correlation with anything, leave them as zeros
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def dhash(image_gray: np.ndarray, size: int = 8) -> np.ndarray:
+    # Difference hash, one bit per horizontally adjacent pixel pair of a (size + 1) x size thumbnail
+    thumbnail = cv2.resize(image_gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    return np.packbits(thumbnail[:, 1:] > thumbnail[:, :-1])
+
+
+def atlas_paths(name: str) -> tuple[str, str]:
+    return f"{atlas_folder}/{name}.npy", f"{atlas_folder}/{name}.json"
+
+
+def template_folder(name: str) -> str:
+    return f"{get_project_root()}/bot/ingestion/{name}"
+
+
+def source_index(name: str) -> dict:
+    """
+    Template names of bot/ingestion/<name>, in atlas order, and the modification time and size of each PNG, so an
+    edited template makes the atlas out of date as much as an added or removed one
+    """
+    folder = template_folder(name)
+    names = sorted(_image.split(".")[0] for _image in listdir(folder))
+    sources = {}
+    for _name in names:
+        status = stat(f"{folder}/{_name}.png")
+        sources[_name] = [status.st_mtime_ns, status.st_size]
+    return {"names": names, "sources": sources}
+
+
+def write_replacing(path: str, mode: str, write) -> None:
+    # Write to a temporary file of its own, then rename, so a worker loading the atlas never sees a partial file
+    # and workers building it at the same time never write to each other's
+    descriptor, temporary_path = mkstemp(dir=atlas_folder, suffix=".tmp")
+    with fdopen(descriptor, mode) as file:
+        write(file)
+    replace(temporary_path, path)
+
+
+def build_atlas(name: str) -> dict:
+    """
+    Pack every PNG in bot/ingestion/<name> into one uint8 grayscale array (.npy) and its index (.json)
+    """
+    index = source_index(name)
+    folder = template_folder(name)
+    templates = np.stack(
+        [cv2.cvtColor(cv2.imread(f"{folder}/{_name}.png"), cv2.COLOR_BGR2GRAY) for _name in index["names"]]
+    )
+
+    makedirs(atlas_folder, exist_ok=True)
+    images_path, index_path = atlas_paths(name)
+    # The index last, once it matches the sources the images do too
+    write_replacing(images_path, "wb", lambda file: np.save(file, templates))
+    write_replacing(index_path, "w", lambda file: dump(index, file))
+    return index
+
+
+def load_atlas(name: str) -> tuple[list[Champion], np.ndarray]:
+    """
+    Memory-map the atlas of bot/ingestion/<name>, (re)building it when it is missing or out of date
+    """
+    images_path, index_path = atlas_paths(name)
+    index = source_index(name)
+    built = None
+    if exists(images_path) and exists(index_path):
+        with open(index_path) as file:
+            built = load(file)
+    if built != index:
+        index = build_atlas(name)
+    return index["names"], np.load(images_path, mmap_mode="r")
+
+
+@dataclass
+class TemplateBank:
+    """
+    Grayscale champion templates, converted once, with resized copies cached per target ROI size
+    """
+
+    templates: dict[Champion, np.ndarray] = field(default_factory=dict)
+    max_sizes: int = 16
+    _resized: OrderedDict[tuple[int, int], dict[Champion, np.ndarray]] = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    _matrices: OrderedDict[tuple[int, int], np.ndarray] = field(default_factory=OrderedDict, init=False, repr=False)
+    _hashes: np.ndarray | None = field(default=None, init=False, repr=False)
+
+    @classmethod
+    def from_images(cls, images: dict[Champion, np.ndarray], max_sizes: int = 16) -> "TemplateBank":
+        return cls(
+            templates={name: cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) for name, image in images.items()},
+            max_sizes=max_sizes,
+        )
+
+    @classmethod
+    def from_atlas(cls, name: str, max_sizes: int = 16) -> "TemplateBank":
+        names, templates = load_atlas(name)
+        # Rows of the memory-mapped atlas, pages are only read when a template is first resized
+        return cls(templates=dict(zip(names, templates)), max_sizes=max_sizes)
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    @property
+    def names(self) -> list[Champion]:
+        return list(self.templates)
+
+    def _cached(self, cache: OrderedDict, key: tuple[int, int], build):
+        if key in cache:
+            # Mark as most recently used
+            cache.move_to_end(key)
+            return cache[key]
+
+        value = build(*key)
+        cache[key] = value
+        # Evict the least recently used size
+        if len(cache) > self.max_sizes:
+            cache.popitem(last=False)
+        return value
+
+    def resized(self, width: int, height: int) -> dict[Champion, np.ndarray]:
+        return self._cached(
+            self._resized,
+            (width, height),
+            lambda _width, _height: {
+                name: cv2.resize(template, (_width, _height)) for name, template in self.templates.items()
+            },
+        )
+
+    def matrix(self, width: int, height: int) -> np.ndarray:
+        """
+        Every template resized to (width, height), flattened and normalized into one row, in `names` order
+        """
+        return self._cached(
+            self._matrices,
+            (width, height),
+            lambda _width, _height: normalize_rows(
+                np.stack([template.ravel() for template in self.resized(_width, _height).values()])
+            ),
+        )
+
+    @property
+    def hashes(self) -> np.ndarray:
+        # dHash of every template, in `names` order, computed once at the template's own resolution
+        if self._hashes is None:
+            self._hashes = np.stack([dhash(template) for template in self.templates.values()])
+        return self._hashes
+
+    def shortlist(self, image_gray: np.ndarray, size: int) -> np.ndarray:
+        """
+        Indexes (in `names` order) of the `size` templates with the closest dHash to the image, closest first
+        """
+        distances = np.unpackbits(self.hashes ^ dhash(image_gray), axis=1).sum(axis=1)
+        if size >= len(distances):
+            return np.argsort(distances, kind="stable")
+        closest = np.argpartition(distances, size)[:size]
+        return closest[np.argsort(distances[closest], kind="stable")]
+
+    def clear(self) -> None:
+        self._resized.clear()
+        self._matrices.clear()
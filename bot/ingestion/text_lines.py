@@ -0,0 +1,111 @@
+import cv2
+import numpy as np
+
+# Pixels brighter than this are text (or icons), the scoreboard background is darker
+text_threshold = 70
+# Icons are mostly mid tones, text is bright strokes on the dark background with little in between
+max_mid_tones = 0.2
+
+
+def find_text_segments(gray: np.ndarray, threshold: int = text_threshold) -> tuple[float, list[list[int]]]:
+    """
+    Boxes [x0, y0, x1, y1] of runs of glyphs in a grayscale screenshot, left to right, and the glyph height used
+    to group them. Champion portraits and item icons are left out, as blobs much taller than a glyph or as runs
+    made mostly of mid tones.
+    """
+    _, _, boxes, _ = cv2.connectedComponentsWithStats((gray > threshold).astype(np.uint8))
+    # Skip the background component and single pixel noise
+    boxes = boxes[1:]
+    boxes = boxes[boxes[:, cv2.CC_STAT_AREA] >= 3]
+    if not len(boxes):
+        return 0.0, []
+
+    x, y, width, height = (boxes[:, stat] for stat in range(4))
+    # Text is most of the components, so the median is a glyph, whatever the screenshot's scale
+    glyph = float(np.median(height))
+    # Tall enough to keep the title, shorter than portraits and items
+    tall = height > 2.4 * glyph
+    # Separators and frames, long but flat
+    rules = (width > 4 * glyph) & (height < 0.5 * glyph)
+    # Icons break into fragments, drop anything centered inside a tall component
+    center_x = (x + width / 2)[:, None]
+    center_y = (y + height / 2)[:, None]
+    inside_icon = (
+        (center_x >= x[tall])
+        & (center_x <= (x + width)[tall])
+        & (center_y >= y[tall])
+        & (center_y <= (y + height)[tall])
+    ).any(axis=1)
+    keep = ~(tall | rules | inside_icon)
+
+    segments = []
+    for left, top, right, bottom in sorted(zip(x[keep], y[keep], (x + width)[keep], (y + height)[keep])):
+        # Join a segment on the same row that ends close by, gaps inside "3 / 4 / 7" are under 2 glyphs
+        for segment in segments:
+            if left - segment[2] <= 2 * glyph and min(bottom, segment[3]) > max(top, segment[1]):
+                segment[:] = (
+                    min(left, segment[0]),
+                    min(top, segment[1]),
+                    max(right, segment[2]),
+                    max(bottom, segment[3]),
+                )
+                break
+        else:
+            segments.append([int(left), int(top), int(right), int(bottom)])
+
+    def is_text(segment: list[int]) -> bool:
+        crop = gray[segment[1] : segment[3], segment[0] : segment[2]]
+        mid_tones = np.count_nonzero((crop > threshold // 2) & (crop <= threshold)) / crop.size
+        # Specks left over from icons are flatter than any glyph
+        return segment[3] - segment[1] >= glyph / 2 and mid_tones <= max_mid_tones
+
+    return glyph, [segment for segment in segments if is_text(segment)]
+
+
+def group_lines(segments: list[list[int]]) -> list[list[list[int]]]:
+    """
+    Segments grouped into lines, top to bottom, each line left to right
+    """
+    lines = []
+    for segment in sorted(segments, key=lambda _segment: _segment[1] + _segment[3]):
+        # Same line when each one's vertical center is inside the other, a tall segment alone never chains lines
+        if lines and any(
+            _segment[1] <= (segment[1] + segment[3]) / 2 <= _segment[3]
+            and segment[1] <= (_segment[1] + _segment[3]) / 2 <= segment[3]
+            for _segment in lines[-1]
+        ):
+            lines[-1].append(segment)
+        else:
+            lines.append([segment])
+    return [sorted(line) for line in lines]
+
+
+def pack_text_lines(gray: np.ndarray, threshold: int = text_threshold) -> np.ndarray:
+    """
+    Crop every text segment of a grayscale screenshot and pack them into one smaller image that keeps the reading
+    order: lines stacked top to bottom, the segments of a line side by side with the long gaps between them shortened
+    """
+    glyph, segments = find_text_segments(gray, threshold)
+    if not segments:
+        return gray
+    pad = max(round(glyph / 2), 1)
+    # Wide enough that the detector never joins two segments into one box
+    gap = 3 * round(glyph)
+    background = int(np.median(gray))
+    height, width = gray.shape
+
+    rows = []
+    for line in group_lines(segments):
+        top = max(min(segment[1] for segment in line) - pad, 0)
+        bottom = min(max(segment[3] for segment in line) + pad, height)
+        crops = [gray[top:bottom, max(segment[0] - pad, 0) : min(segment[2] + pad, width)] for segment in line]
+        spacer = np.full((bottom - top, gap), background, np.uint8)
+        rows.append(np.hstack([part for crop in crops for part in (spacer, crop)] + [spacer]))
+
+    packed_height = sum(row.shape[0] + pad for row in rows) + pad
+    packed = np.full((packed_height, max(row.shape[1] for row in rows)), background, np.uint8)
+    offset = pad
+    for row in rows:
+        packed[offset : offset + row.shape[0], : row.shape[1]] = row
+        offset += row.shape[0] + pad
+    return packed
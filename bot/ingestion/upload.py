@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from bot.consts import upload_format, upload_max_pixels, upload_quality
+from bot.ingestion.cache import content_hash
+
+# The title, date and team headers sit within this many portrait heights above the first player row
+header_portraits = 5.75
+# Extension, quality flag and MIME type of each upload format
+encodings = {
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, "image/jpeg"),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, "image/webp"),
+}
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    source_pixels: int  # of the screenshot before cropping and downscaling
+    key: str = ""  # content hash of the screenshot, what recorded answers are replayed by
+
+    @property
+    def blob(self) -> dict[str, str | bytes]:
+        # What generate_content takes as an inline image part
+        return {"mime_type": self.mime_type, "data": self.data}
+
+
+def decode_screenshot(image_bytes: bytes) -> np.ndarray:
+    return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+
+def crop_scoreboard(image: np.ndarray, portraits: list[tuple[int, int, int, int]] | None) -> np.ndarray:
+    """
+    Rows of the screenshot from the result title to just under the last player, found from the champion portraits.
+    The full width is kept, the objectives are on the right. Without portraits the screenshot is returned as is.
+    """
+    if not portraits:
+        return image
+    portrait_height = max(portrait[3] for portrait in portraits)
+    top = max(int(min(portrait[1] for portrait in portraits) - header_portraits * portrait_height), 0)
+    bottom = min(int(max(portrait[1] for portrait in portraits) + 1.5 * portrait_height), image.shape[0])
+    return image[top:bottom]
+
+
+def downscale(image: np.ndarray, max_pixels: int) -> np.ndarray:
+    height, width = image.shape[:2]
+    if height * width <= max_pixels:
+        return image
+    scale = (max_pixels / (height * width)) ** 0.5
+    return cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+def prepare_upload(
+    image: np.ndarray,
+    portraits: list[tuple[int, int, int, int]] | None = None,
+    max_pixels: int = upload_max_pixels,
+    image_format: str = upload_format,
+    quality: int = upload_quality,
+    key: str | None = None,
+) -> PreparedImage:
+    """
+    Crop a BGR screenshot to the scoreboard, fit it in max_pixels and encode it as JPEG or WebP for the model.
+    `key` is the screenshot's content hash, computed here when the caller does not have it yet.
+    """
+    extension, quality_flag, mime_type = encodings[image_format]
+    prepared = downscale(crop_scoreboard(image, portraits), max_pixels)
+    encoded, buffer = cv2.imencode(extension, prepared, [quality_flag, quality])
+    if not encoded:
+        raise ValueError(f"Could not encode the screenshot as {image_format}")
+    return PreparedImage(
+        buffer.tobytes(),
+        mime_type,
+        prepared.shape[1],
+        prepared.shape[0],
+        image.shape[0] * image.shape[1],
+        key or content_hash(image),
+    )
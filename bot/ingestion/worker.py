@@ -0,0 +1,30 @@
+# Jobs of the recognition worker processes, the bot itself only imports this module when the pool is first needed
+import cv2
+import numpy as np
+
+from api.consts import Champion
+from bot.ingestion.match import Engine, ImageRecognition
+
+# One per worker process, created by the pool initializer so the templates are only loaded once
+_worker: dict[str, ImageRecognition] = {}
+
+
+def init_worker(engine: Engine) -> None:
+    _worker["image_recognition"] = ImageRecognition(engine=engine)
+
+
+def ready() -> bool:
+    # A no-op job, submitting one per worker starts them all and loads their templates
+    return "image_recognition" in _worker
+
+
+def recognize(
+    image_bytes: bytes,
+) -> tuple[list[Champion | None], tuple[list[Champion], list[Champion]], list[tuple[int, int, int, int]], np.ndarray]:
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    image_recognition = _worker["image_recognition"]
+    # Recognition draws the portrait ROIs on its screenshot, the decoded one goes back to the bot untouched
+    image_recognition.set_screenshot(image.copy())
+    portraits = image_recognition.calculate_rois()
+    champions = image_recognition.get_raw_champions(portraits, image_recognition.champion_bank)
+    return champions, image_recognition.get_bans(portraits), portraits, image
@@ -3,11 +3,21 @@ from os.path import exists
 
 from dotenv import load_dotenv
 
-from bot.client import client
-from bot.consts import data_folder, matches_folder
+from bot.startup import import_timed, timed
 
-if __name__ == "__main__":
+# Before bot.consts, which reads its settings from the environment when imported
+with timed("load .env"):
     load_dotenv()
+
+from bot.consts import data_folder, matches_folder  # noqa: E402
+
+# Heaviest dependencies first, so the startup report shows each one's own import cost
+startup_modules = ("discord", "beanie", "api.models.match", "bot.commands.match", "bot.client")
+
+if __name__ == "__main__":
+    for _module in startup_modules:
+        import_timed(_module)
+    client = import_timed("bot.client").client
     if not exists(data_folder):
         mkdir(data_folder)
     if not exists(matches_folder):
@@ -0,0 +1,36 @@
+from contextlib import contextmanager
+from importlib import import_module
+import sys
+from time import perf_counter
+from types import ModuleType
+from typing import Iterator
+
+# Set when this module is first imported, bot.main does it before anything else
+started = perf_counter()
+# Seconds spent on each import or setup step, in the order they ran
+timings: dict[str, float] = {}
+
+
+@contextmanager
+def timed(step: str) -> Iterator[None]:
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings[step] = perf_counter() - start
+
+
+def import_timed(name: str) -> ModuleType:
+    """
+    Import a module, recording how long it took when it was not loaded yet. Importing dependencies one by one,
+    heaviest first, splits the cost by module: each import only pays for what the previous ones did not load.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    with timed(f"import {name}"):
+        return import_module(name)
+
+
+def startup_report() -> str:
+    steps = ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timings.items())
+    return f"Started in {perf_counter() - started:.2f}s ({steps})"
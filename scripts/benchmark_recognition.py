@@ -0,0 +1,148 @@
+import argparse
+from json import dump, load
+from os import listdir
+import re
+import sys
+from time import perf_counter
+
+import cv2
+
+from bot import get_project_root
+from bot.ingestion.match import ImageRecognition
+from tests.ingestion.test_champions import correct_bans, correct_guesses
+
+data_folder = f"{get_project_root()}/tests/data"
+baseline_path = f"{get_project_root()}/tests/ingestion/recognition_baseline.json"
+
+
+def label_index(image_name: str) -> int:
+    # test4_bigger.png -> 4
+    return int(re.match(r"test(\d+)", image_name).group(1))
+
+
+def run_benchmark(
+    engine: str = "template", shortlist: int | None = 20, repeats: int = 3, layout_cache: bool = False
+) -> dict:
+    """
+    Recognize every screenshot in tests/data, timing each stage, and score it against the test labels.
+    Timings are the best of `repeats` runs, after one untimed warm-up run that fills the template caches.
+    """
+    start = perf_counter()
+    image_recognition = ImageRecognition(engine=engine, shortlist=shortlist, use_layout_cache=layout_cache)
+    template_load = perf_counter() - start
+
+    images = {}
+    total = 0.0
+    for image_name in sorted((name for name in listdir(data_folder) if name.endswith(".png")), key=label_index):
+        index = label_index(image_name)
+        screenshot = cv2.imread(f"{data_folder}/{image_name}")
+
+        timings = {"rois": [], "champions": [], "bans": [], "cold": []}
+        for run in range(repeats + 1):
+            # calculate_rois draws the detected portraits onto the screenshot, start every run from a clean copy
+            image_recognition.set_screenshot(screenshot.copy())
+            start = perf_counter()
+            rois = image_recognition.calculate_rois()
+            rois_done = perf_counter()
+            champions = image_recognition.get_raw_champions(rois, image_recognition.champion_bank)
+            champions_done = perf_counter()
+            bans = image_recognition.get_bans(rois)
+            bans_done = perf_counter()
+            if not run:
+                # Includes resizing the templates to a size not seen yet, which the atlas load leaves to the first match
+                timings["cold"].append(bans_done - start)
+            else:
+                timings["rois"].append(rois_done - start)
+                timings["champions"].append(champions_done - rois_done)
+                timings["bans"].append(bans_done - champions_done)
+
+        expected = correct_guesses[index - 1]
+        result = {
+            "rois_ms": round(min(timings["rois"]) * 1000, 2),
+            "champions_ms": round(min(timings["champions"]) * 1000, 2),
+            "bans_ms": round(min(timings["bans"]) * 1000, 2),
+            "cold_ms": round(timings["cold"][0] * 1000, 2),
+            # Template matches spent per image, more than one per ROI means the grow search ran
+            "evaluations": sum(roi_match.evaluations for roi_match in image_recognition.roi_matches),
+            "accuracy": sum(guess == champion for guess, champion in zip(champions, expected)) / len(expected),
+            "bans_correct": bans == correct_bans[index] if index in correct_bans else None,
+        }
+        result["total_ms"] = round(result["rois_ms"] + result["champions_ms"] + result["bans_ms"], 2)
+        total += result["total_ms"] / 1000
+        images[image_name] = result
+
+    return {
+        "config": {"engine": engine, "shortlist": shortlist, "repeats": repeats, "layout_cache": layout_cache},
+        "template_load_ms": round(template_load * 1000, 2),
+        "images": images,
+        "totals": {
+            "images_per_second": round(len(images) / total, 2),
+            "accuracy": sum(image["accuracy"] for image in images.values()) / len(images),
+            "evaluations": sum(image["evaluations"] for image in images.values()),
+        },
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float | None = 0.5) -> list[str]:
+    """
+    Regressions of `result` against `baseline`: any image whose accuracy dropped, bans that stopped matching and,
+    unless tolerance is None, a throughput more than `tolerance` (as a fraction) below the baseline
+    """
+    regressions = []
+    for image_name, expected in baseline["images"].items():
+        actual = result["images"].get(image_name)
+        if actual is None:
+            regressions.append(f"{image_name}: missing")
+            continue
+        if actual["accuracy"] < expected["accuracy"]:
+            regressions.append(f"{image_name}: accuracy {actual['accuracy']:.2f} < {expected['accuracy']:.2f}")
+        if expected["bans_correct"] and not actual["bans_correct"]:
+            regressions.append(f"{image_name}: bans no longer match")
+
+    if tolerance is not None:
+        minimum = baseline["totals"]["images_per_second"] * (1 - tolerance)
+        if result["totals"]["images_per_second"] < minimum:
+            regressions.append(
+                f"throughput {result['totals']['images_per_second']:.2f} images/s < {minimum:.2f} images/s"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark champion and ban recognition over tests/data")
+    parser.add_argument("--engine", choices=["template", "vectorized"], default="template")
+    parser.add_argument("--shortlist", type=int, default=20, help="0 to correlate against every template")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--layout-cache", action="store_true", help="reuse ROI layouts between runs")
+    parser.add_argument("--output", help="write the results to this JSON file, e.g. a new baseline")
+    parser.add_argument("--check", nargs="?", const=baseline_path, help="fail on regressions against a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed throughput drop, as a fraction")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.engine, args.shortlist or None, args.repeats, args.layout_cache)
+    for image_name, image in result["images"].items():
+        print(
+            f"{image_name:18} rois {image['rois_ms']:7.2f}ms  champions {image['champions_ms']:7.2f}ms  "
+            f"bans {image['bans_ms']:7.2f}ms  cold {image['cold_ms']:7.2f}ms  "
+            f"evaluations {image['evaluations']:3}  accuracy {image['accuracy']:.2f}"
+        )
+    totals = result["totals"]
+    print(
+        f"template load {result['template_load_ms']:.2f}ms, {totals['images_per_second']:.2f} images/s, "
+        f"accuracy {totals['accuracy']:.3f}"
+    )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            dump(result, file, indent=2)
+    if args.check:
+        with open(args.check) as file:
+            regressions = compare(result, load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
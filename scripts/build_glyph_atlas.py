@@ -0,0 +1,59 @@
+from collections import defaultdict
+from os import makedirs
+
+import cv2
+import numpy as np
+
+from bot import get_project_root
+from bot.ingestion.digits import glyphs_folder, number_crops, scoreboard_gray, segment_glyphs
+
+# Objectives numbers of each team, read left to right, for the screenshots the glyphs are sampled from
+labels = {
+    "test5.png": ("8326", "7400"),
+    "test6.png": ("500301", "912214"),
+    "test7.png": ("1120304", "100002"),
+    "test8.png": ("", "100100"),
+    "test9.png": ("921114", "300302"),
+    "test10.png": ("710213", "200103"),
+    "test11.png": ("201002", "1140414"),
+    "test12.png": ("1010405", "200011"),
+    "test13.png": ("600200", "711103"),
+    "test14.png": ("810214", "100102"),
+    "test15.png": ("912414", "500102"),
+    "test16.png": ("300115", "000101"),
+}
+
+
+def labelled_glyphs(image_name: str) -> list[tuple[np.ndarray, str]]:
+    """
+    The glyphs of a labelled screenshot's objectives numbers, each with its digit, cropped as OCR.get_text does
+    """
+    numbers_images = number_crops(scoreboard_gray(cv2.imread(f"{get_project_root()}/tests/data/{image_name}")))
+    labelled = []
+    for team, digits in zip(("blue", "red"), labels[image_name]):
+        glyphs = [glyph for number_image in numbers_images[team] for glyph in segment_glyphs(number_image)]
+        # A missed or merged number would shift every label after it
+        if len(glyphs) != len(digits):
+            print(f"Skipping {image_name} {team}: {len(glyphs)} glyphs for {len(digits)} digits")
+            continue
+        labelled += zip(glyphs, digits)
+    return labelled
+
+
+def build_glyph_atlas() -> None:
+    """
+    Write one vertical sheet per digit to bot/ingestion/glyphs, with every sample glyph of that digit
+    """
+    samples = defaultdict(list)
+    for image_name in labels:
+        for glyph, digit in labelled_glyphs(image_name):
+            samples[digit].append(glyph)
+
+    makedirs(glyphs_folder, exist_ok=True)
+    for digit, glyphs in sorted(samples.items()):
+        cv2.imwrite(f"{glyphs_folder}/{digit}.png", np.vstack(glyphs))
+        print(f"{digit}: {len(glyphs)} samples")
+
+
+if __name__ == "__main__":
+    build_glyph_atlas()
@@ -0,0 +1,165 @@
+import argparse
+from asyncio import Semaphore, gather, run, to_thread
+from collections import Counter
+from cProfile import Profile
+from os import listdir
+from os.path import exists
+from pstats import Stats
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import numpy as np
+
+from api.models.match import Match
+from bot.consts import replay_error_rate, replay_folder, replay_jitter, replay_latency
+from bot.ingestion.artifacts import ArtifactWriter
+from bot.ingestion.backends import ReplayBackend, load_responses
+from bot.ingestion.executor import RecognitionExecutor
+from bot.ingestion.gemini import fetch_fields, match_prompt
+from bot.ingestion.upload import prepare_upload
+
+stages = ("recognize", "prepare", "model", "validate", "store")
+
+
+def replayed_screenshots(folder: str = replay_folder) -> list[bytes]:
+    # The screenshots a recorded answer exists for, as uploaded
+    names = sorted(
+        name.removesuffix(".png")
+        for name in listdir(folder)
+        if name.endswith(".png") and exists(f"{folder}/responses/{name.removesuffix('.png')}.json")
+    )
+    screenshots = []
+    for name in names:
+        with open(f"{folder}/{name}.png", "rb") as file:
+            screenshots.append(file.read())
+    return screenshots
+
+
+async def run_load_test(
+    uploads: int = 20,
+    concurrency: int = 4,
+    latency: float = replay_latency,
+    jitter: float = replay_jitter,
+    error_rate: float = replay_error_rate,
+    workers: int = 1,
+    seed: int | None = 0,
+) -> dict:
+    """
+    Push `uploads` screenshots through the upload pipeline, `concurrency` at a time, with the models replayed:
+    champion recognition and decoding, the upload encoding, the hedged model request, the match validation and the
+    screenshot storage, in a temporary folder. Only the database and Discord are left out.
+    """
+    screenshots = replayed_screenshots()
+    responses = load_responses()
+    backends = (
+        ReplayBackend("replay-pro", responses, latency, jitter, error_rate, seed),
+        ReplayBackend("replay-flash", responses, latency, jitter, error_rate, None if seed is None else seed + 1),
+    )
+    # Deep enough that the load test measures the pipeline, not the bot's rejection of a burst
+    executor = RecognitionExecutor(workers=workers, max_queue=concurrency)
+    await executor.warm_up()
+    prompt = match_prompt(["PretinhoDaGuiné", "Filipados", "Mazzeee", "Sinj", "zau", "Elesh95", "madafz"])
+    semaphore = Semaphore(concurrency)
+    timings: dict[str, list[float]] = {stage: [] for stage in stages}
+    outcomes = Counter()
+
+    async def upload(image_bytes: bytes, writer: ArtifactWriter) -> None:
+        async with semaphore:
+            try:
+                start = perf_counter()
+                champions, bans, portraits, image = await executor.recognize(image_bytes)
+                recognized = perf_counter()
+                prepared = await to_thread(prepare_upload, image, portraits)
+                encoded = perf_counter()
+                fields = await fetch_fields(prompt, prepared, backends)
+                answered = perf_counter()
+                for team in ["blue", "red"]:
+                    for player in fields[f"{team}_team"]["players"]:
+                        player["discord_id"] = None
+                        player["picked_champion"] = champions.pop(0) if champions else None
+                Match(**fields)
+                validated = perf_counter()
+                await writer.store(image, prepared.key)
+                stored = perf_counter()
+            except Exception as e:
+                outcomes[type(e).__name__] += 1
+                return
+            outcomes["ok"] += 1
+            for stage, seconds in zip(
+                stages,
+                np.diff([start, recognized, encoded, answered, validated, stored]),
+            ):
+                timings[stage].append(float(seconds))
+
+    with TemporaryDirectory() as folder:
+        writer = ArtifactWriter(folder)
+        start = perf_counter()
+        try:
+            await gather(*(upload(screenshots[index % len(screenshots)], writer) for index in range(uploads)))
+        finally:
+            executor.shutdown()
+        elapsed = perf_counter() - start
+
+    return {
+        "config": {
+            "uploads": uploads,
+            "concurrency": concurrency,
+            "latency": latency,
+            "jitter": jitter,
+            "error_rate": error_rate,
+            "workers": workers,
+            "screenshots": len(screenshots),
+        },
+        "elapsed_s": round(elapsed, 2),
+        "uploads_per_second": round(outcomes["ok"] / elapsed, 2),
+        "outcomes": dict(outcomes),
+        # Requests each model got, more secondary ones than failures means slow primaries were hedged
+        "requests": {backend.name: backend.requests for backend in backends},
+        "stages_ms": {
+            stage: {
+                "p50": round(float(np.quantile(values, 0.5)) * 1000, 2),
+                "p95": round(float(np.quantile(values, 0.95)) * 1000, 2),
+            }
+            for stage, values in timings.items()
+            if values
+        },
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the upload pipeline offline, with replayed models")
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=replay_latency, help="seconds before each model answer")
+    parser.add_argument("--jitter", type=float, default=replay_jitter, help="seconds added at random to the latency")
+    parser.add_argument("--error-rate", type=float, default=replay_error_rate, help="fraction of failed requests")
+    parser.add_argument("--workers", type=int, default=1, help="recognition processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", help="write cProfile stats of the event loop process to this file")
+    args = parser.parse_args()
+
+    profile = Profile() if args.profile else None
+    if profile:
+        profile.enable()
+    result = run(
+        run_load_test(
+            args.uploads, args.concurrency, args.latency, args.jitter, args.error_rate, args.workers, args.seed
+        )
+    )
+    if profile:
+        profile.disable()
+        profile.dump_stats(args.profile)
+        Stats(profile).sort_stats("cumulative").print_stats(20)
+
+    for stage, percentiles in result["stages_ms"].items():
+        print(f"{stage:10} p50 {percentiles['p50']:9.2f}ms  p95 {percentiles['p95']:9.2f}ms")
+    print(
+        f"{result['uploads_per_second']:.2f} uploads/s over {result['elapsed_s']:.2f}s, outcomes {result['outcomes']}, "
+        f"model requests {result['requests']}"
+    )
+    return 0 if result["outcomes"].get("ok") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+from asyncio import gather
+from os import listdir
+
+import cv2
+import pytest
+
+from bot import get_project_root
+from bot.ingestion.artifacts import ArtifactWriter, thumbnail_width
+from bot.ingestion.cache import content_hash
+
+
+@pytest.mark.asyncio
+async def test_artifact_writer(tmp_path):
+    writer = ArtifactWriter(folder=str(tmp_path))
+    image = cv2.imread(f"{get_project_root()}/tests/data/test10.png")
+    key = content_hash(image)
+    assert await writer.submit(image, key)
+    # Written once, the same screenshot uploaded again is skipped
+    assert not await writer.store(image.copy(), key)
+
+    path, thumbnail_path = writer.paths(key)
+    assert (cv2.imread(path) == image).all()
+    assert cv2.imread(thumbnail_path).shape[1] == thumbnail_width
+    assert not [name for name in listdir(f"{tmp_path}/{key[:2]}") if name.endswith(".tmp")]
+    assert not writer._tasks
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_of_the_same_screenshot(tmp_path):
+    writer = ArtifactWriter(folder=str(tmp_path))
+    image = cv2.imread(f"{get_project_root()}/tests/data/test10.png")
+    key = content_hash(image)
+    # Both start before either has finished, so neither skips the write
+    await gather(writer.store(image, key), writer.store(image, key))
+    assert (cv2.imread(writer.paths(key)[0]) == image).all()
@@ -0,0 +1,67 @@
+import pytest
+
+from api.models.match import Match
+from bot import get_project_root
+from bot.exceptions import GeminiError
+from bot.ingestion.backends import ReplayBackend, ReplayError, load_responses
+from bot.ingestion.gemini import ask_model, fetch_fields
+from bot.ingestion.hedging import HedgedRequest, HedgePolicy
+from bot.ingestion.upload import decode_screenshot, prepare_upload
+from scripts.load_test_upload import run_load_test
+
+
+def upload_of(name: str):
+    with open(f"{get_project_root()}/tests/data/{name}.png", "rb") as file:
+        return prepare_upload(decode_screenshot(file.read()))
+
+
+def test_recorded_responses_are_matches():
+    responses = load_responses()
+    assert len(responses) == 2
+    for name in ("test8", "test14"):
+        assert upload_of(name).key in responses
+
+
+@pytest.mark.asyncio
+async def test_replay_backend():
+    backend = ReplayBackend("replay", load_responses(), latency=0.01, jitter=0.01, error_rate=0, seed=0)
+    fields = await ask_model(backend, "prompt", upload_of("test8"))
+    for team in ["blue", "red"]:
+        for player in fields[f"{team}_team"]["players"]:
+            player["discord_id"] = None
+    match = Match(**fields)
+    assert match.winner == "blue"
+    assert match.blue_team.players[0].name == "PretinhoDaGuiné"
+    assert sum(player.stats.kills for player in match.blue_team.players) == match.blue_team.stats.kills
+
+    with pytest.raises(ReplayError):
+        await backend.generate("prompt", upload_of("test10"))
+    backend.error_rate = 1
+    with pytest.raises(ReplayError):
+        await backend.generate("prompt", upload_of("test8"))
+    assert backend.requests == 3
+
+
+@pytest.mark.asyncio
+async def test_fetch_fields_hedges_failed_requests():
+    responses = load_responses()
+    upload = upload_of("test14")
+    failing = ReplayBackend("failing", responses, latency=0, jitter=0, error_rate=1)
+    working = ReplayBackend("working", responses, latency=0, jitter=0, error_rate=0)
+    fields = await fetch_fields("prompt", upload, (failing, working))
+    assert fields["blue_team"]["players"][0]["name"] == "sir silv slayer"
+    assert failing.requests == working.requests == 1
+
+    with pytest.raises(GeminiError):
+        await HedgedRequest(
+            lambda: ask_model(failing, "prompt", upload),
+            lambda: ask_model(failing, "prompt", upload),
+            policy=HedgePolicy(initial_delay=0),
+        )()
+
+
+@pytest.mark.asyncio
+async def test_load_test_runs_offline():
+    result = await run_load_test(uploads=2, concurrency=2, latency=0, jitter=0, error_rate=0)
+    assert result["outcomes"] == {"ok": 2}
+    assert set(result["stages_ms"]) == {"recognize", "prepare", "model", "validate", "store"}
@@ -0,0 +1,25 @@
+from json import load
+
+from scripts.benchmark_recognition import baseline_path, compare, run_benchmark
+
+
+def test_recognition_matches_baseline():
+    result = run_benchmark(repeats=1)
+    with open(baseline_path) as file:
+        baseline = load(file)
+    # Timings depend on the machine, only accuracy is gated here, use the script's --check for throughput
+    assert compare(result, baseline, tolerance=None) == []
+
+
+def test_compare_reports_regressions():
+    baseline = {
+        "images": {"test1.png": {"accuracy": 1.0, "bans_correct": True}},
+        "totals": {"images_per_second": 10.0},
+    }
+    result = {
+        "images": {"test1.png": {"accuracy": 0.9, "bans_correct": False}},
+        "totals": {"images_per_second": 4.0},
+    }
+    assert len(compare(result, baseline)) == 3
+    assert len(compare(result, baseline, tolerance=None)) == 2
+    assert compare(baseline, baseline) == []
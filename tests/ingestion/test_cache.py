@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+from bot import get_project_root
+from bot.ingestion import cache as cache_module, gemini, upload as upload_module
+from bot.ingestion.cache import ExtractionCache, content_hash, hash_distance, max_perceptual_distance, perceptual_hash
+
+
+class MemoryRedis:
+    # The few Redis commands the cache uses, without expiry
+    def __init__(self):
+        self.values = {}
+        self.sorted_sets = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    async def zadd(self, key, mapping):
+        self.sorted_sets.setdefault(key, {}).update(mapping)
+
+    async def zrange(self, key, start, end):
+        return sorted(self.sorted_sets.get(key, {}), key=self.sorted_sets.get(key, {}).get)
+
+    async def zremrangebyscore(self, key, minimum, maximum):
+        members = self.sorted_sets.get(key, {})
+        for member in [member for member, score in members.items() if score <= maximum]:
+            del members[member]
+
+
+def screenshot(name: str) -> np.ndarray:
+    return cv2.imread(f"{get_project_root()}/tests/data/{name}")
+
+
+def recompressed(image: np.ndarray) -> np.ndarray:
+    return cv2.imdecode(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 80])[1], cv2.IMREAD_COLOR)
+
+
+def test_hashes():
+    image = screenshot("test10.png")
+    assert content_hash(image) == content_hash(image.copy())
+    assert content_hash(image) != content_hash(recompressed(image))
+    assert hash_distance(perceptual_hash(image), perceptual_hash(recompressed(image))) <= max_perceptual_distance
+    assert hash_distance(perceptual_hash(image), perceptual_hash(screenshot("test16.png"))) > max_perceptual_distance
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["exact", "perceptual"])
+async def test_extraction_cache(mode):
+    cache = ExtractionCache(MemoryRedis(), mode=mode)
+    image = screenshot("test10.png")
+    champions = ["Gragas", "Thresh", "Khazix", "Yasuo", "Kaisa", "Lux", "Blitzcrank", "Caitlyn", "Lillia", "Wukong"]
+    assert await cache.get(await cache.hashes(image), champions) is None
+    await cache.set(await cache.hashes(image), {"duration": "25:38"}, champions)
+    assert await cache.get(await cache.hashes(image.copy()), champions) == {"duration": "25:38"}
+    # Only the perceptual mode finds a re-compressed copy, neither mistakes another match for it
+    recompressed_hashes = await cache.hashes(recompressed(image))
+    assert await cache.get(recompressed_hashes, champions) == ({"duration": "25:38"} if mode == "perceptual" else None)
+    assert await cache.get(await cache.hashes(screenshot("test16.png")), champions) is None
+    # A close screenshot is not the same match when other champions were picked in it
+    assert await cache.get(recompressed_hashes, ["Ahri", *champions[1:]]) is None
+
+
+@pytest.mark.asyncio
+async def test_only_stored_matches_are_cached(monkeypatch):
+    redis = MemoryRedis()
+    client = SimpleNamespace(redis=redis, playing_list=[])
+    image = screenshot("test10.png")
+    key = content_hash(image)
+    champions = [None] * 10
+
+    hashed = []
+    for module in (cache_module, upload_module, gemini):
+        monkeypatch.setattr(module, "content_hash", lambda image: hashed.append(image) or key)
+
+    async def fetch_fields(prompt, upload):
+        assert upload.key == key
+        return {"blue_team": {"players": []}, "red_team": {"players": []}}
+
+    async def failing_store(client, fields, *args, **kwargs):
+        raise ValueError("not a valid match")
+
+    async def store(client, fields, image, champions, *args, screenshot=None):
+        assert screenshot == key
+        fields["blue_team"]["players"].append({"discord_id": 1})
+        champions.clear()
+        return "match"
+
+    monkeypatch.setattr(gemini, "fetch_fields", fetch_fields)
+    monkeypatch.setattr(gemini, "store_match", failing_store)
+    with pytest.raises(ValueError):
+        await gemini.create_match(client, image, list(champions))
+    assert not redis.values
+
+    monkeypatch.setattr(gemini, "store_match", store)
+    assert await gemini.create_match(client, image, list(champions)) == "match"
+    # The screenshot is hashed once per upload, for the cache, the upload and the stored match alike
+    assert len(hashed) == 2
+    # Cached as the model answered, before store_match filled it in
+    assert await ExtractionCache(redis).get((key, None), champions) == {
+        "blue_team": {"players": []},
+        "red_team": {"players": []},
+    }
@@ -1,4 +1,6 @@
 import cv2
+import numpy as np
+import pytest
 
 from bot import get_project_root
 from bot.ingestion.match import ImageRecognition
@@ -151,3 +153,101 @@ def test_guess_champions_16():
     champions = img_recognition.get_champions()
     print(champions)
     assert champions == correct_guesses[15]
+
+
+@pytest.mark.parametrize(
+    "image, expected",
+    list(
+        zip(
+            ["test1", "test2", "test3", "test4_bigger", *(f"test{index}" for index in range(5, 17))],
+            correct_guesses,
+        )
+    ),
+)
+@pytest.mark.parametrize("shortlist", [None, 20])
+def test_guess_champions_vectorized(image, expected, shortlist):
+    img_recognition = ImageRecognition(engine="vectorized", shortlist=shortlist, debug=debug)
+    img_recognition.set_screenshot(cv2.imread(f"{get_project_root()}/tests/data/{image}.png"))
+    champions = img_recognition.get_champions()
+    print(champions)
+    assert champions == expected
+
+
+@pytest.mark.parametrize("engine", ["template", "vectorized"])
+def test_unmatched_roi_search_is_bounded(engine):
+    img_recognition = ImageRecognition(engine=engine, debug=debug)
+    # A flat screenshot has no correlation with any template, so every growth step fails
+    img_recognition.set_screenshot(np.zeros((200, 200, 3), np.uint8))
+    champions = img_recognition.get_raw_champions([(10, 10, 40, 40)], img_recognition.champion_bank)
+    assert champions == [None]
+    assert img_recognition.roi_matches[0].evaluations <= img_recognition.max_evaluations
+
+
+def test_layout_cache(monkeypatch):
+    img_recognition = ImageRecognition(debug=debug)
+    screenshot = cv2.imread(f"{get_project_root()}/tests/data/test1.png")
+    img_recognition.set_screenshot(screenshot.copy())
+    rois = img_recognition.calculate_rois()
+
+    detections = []
+    detect_rois = img_recognition.detect_rois
+    monkeypatch.setattr(img_recognition, "detect_rois", lambda *args: detections.append(args) or detect_rois(*args))
+
+    # Same geometry and portraits in place, the cached layout is trusted
+    img_recognition.set_screenshot(screenshot.copy())
+    assert img_recognition.calculate_rois() == rois
+    assert not detections
+
+    # Same geometry but the portraits moved down, the cached layout is rejected
+    img_recognition.set_screenshot(np.roll(screenshot, 20, axis=0))
+    assert img_recognition.calculate_rois() == [(x, y + 20, w, h) for x, y, w, h in rois]
+    assert len(detections) == 1
+
+
+@pytest.mark.parametrize("image", ["test1", "test8", "test14"])
+@pytest.mark.parametrize("shift", [(1, 0), (-1, 0), (0, 1), (0, -1), (2, 0), (-2, 0), (0, 2), (0, -2), (1, 1), (-2, 2)])
+def test_layout_rejects_shifted_portraits(image, shift):
+    hex_colors = ["#eec133", "#846f36", "#8c7332", "#deb533"]
+    img_recognition = ImageRecognition(debug=debug)
+    screenshot = cv2.imread(f"{get_project_root()}/tests/data/{image}.png")
+    crop = screenshot[:, : int(screenshot.shape[1] * 0.2)]
+    rois = img_recognition.detect_rois(crop.copy(), hex_colors)
+    assert img_recognition.layout_matches(crop, rois, hex_colors)
+
+    # Portraits a pixel or two off the cached layout, which would crop the wrong part of every portrait
+    dx, dy = shift
+    shifted = np.roll(screenshot, (dy, dx), axis=(0, 1))[:, : int(screenshot.shape[1] * 0.2)]
+    assert not img_recognition.layout_matches(shifted, rois, hex_colors)
+
+
+def test_color_mask_matches_in_range():
+    hex_colors = ["#eec133", "#846f36", "#8c7332", "#deb533"]
+    screenshot = cv2.imread(f"{get_project_root()}/tests/data/test14.png")
+    hsv_image = cv2.cvtColor(screenshot[:, : int(screenshot.shape[1] * 0.2)], cv2.COLOR_BGR2HSV)
+
+    expected = np.zeros(hsv_image.shape[:2], np.uint8)
+    for hex_color in hex_colors:
+        bgr_color = np.uint8([[[int(hex_color[i : i + 2], 16) for i in (5, 3, 1)]]])
+        hsv_color = cv2.cvtColor(bgr_color, cv2.COLOR_BGR2HSV)[0][0].astype(np.int32)
+        lower_bound = np.clip(hsv_color - [15, 70, 70], 0, 255).astype(np.uint8)
+        upper_bound = np.clip(hsv_color + [15, 70, 70], 0, 255).astype(np.uint8)
+        expected |= cv2.inRange(hsv_image, lower_bound, upper_bound)
+
+    assert (ImageRecognition.color_mask(hsv_image, hex_colors) == expected).all()
+
+
+correct_bans = {
+    1: ([], []),
+    10: (["Udyr", "Renekton", "Vi", "Camille", "Malzahar"], ["Vladimir", "Nami", "Draven", "Vayne", "Volibear"]),
+    12: (["Caitlyn", "DrMundo", "Aurora", "KSante"], ["Vladimir", "Gragas", "Yasuo", "Gwen", "Camille"]),
+    15: (["Azir", "Diana", "Elise", "Trundle", "Aphelios"], ["Alistar", "Bard", "Blitzcrank", "Braum", "Janna"]),
+    16: (["Malzahar", "Zac", "Draven", "Zilean", "Wukong"], ["Mordekaiser", "Lillia", "Hwei", "Gragas", "Vladimir"]),
+}
+
+
+@pytest.mark.parametrize("engine", ["template", "vectorized"])
+def test_guess_bans(engine):
+    image_recognition = ImageRecognition(engine=engine)
+    for index, bans in correct_bans.items():
+        image_recognition.set_screenshot(cv2.imread(f"{get_project_root()}/tests/data/test{index}.png"))
+        assert image_recognition.get_bans() == bans
@@ -0,0 +1,88 @@
+import cv2
+import numpy as np
+
+from bot import get_project_root
+from bot.ingestion.digits import (
+    GlyphClassifier,
+    glyph_size,
+    glyphs_folder,
+    number_crops,
+    scoreboard_gray,
+    segment_glyphs,
+    split_words,
+    stitch_crops,
+)
+from bot.ingestion.templates import normalize_rows
+from scripts.build_glyph_atlas import labelled_glyphs, labels
+
+
+def test_stitch_crops():
+    crops = [np.full((20, 10), 255, np.uint8), np.zeros((16, 30), np.uint8)]
+    strip, starts = stitch_crops(crops)
+    assert strip.shape == (20, 10 + 30 + 2 * 20)
+    assert starts == [0, 30]
+    # Gaps replicate each crop's own background
+    assert (strip[:, :30] == 255).all()
+    assert (strip[:, 30:] == 0).all()
+
+
+def test_split_words():
+    starts = [0, 30, 80]
+    words = {
+        "text": ["", "12", "3", " ", "7"],
+        "left": [0, 5, 35, 60, 50],
+        "width": [80, 10, 8, 4, 6],
+    }
+    # An empty tile stays empty, and a word counts for the tile its center is in
+    assert split_words(words, starts, 3) == ["12", "37", ""]
+
+
+def number_crop(digits: str) -> np.ndarray:
+    # Draw atlas samples scaled up on a dark background, like a number crop from the scoreboard
+    sheets = {digit: cv2.imread(f"{glyphs_folder}/{digit}.png", cv2.IMREAD_GRAYSCALE) for digit in set(digits)}
+    glyphs = [
+        cv2.copyMakeBorder(
+            cv2.resize(sheets[digit][: glyph_size[1]], None, fx=2, fy=2), 0, 0, 3, 3, cv2.BORDER_CONSTANT
+        )
+        for digit in digits
+    ]
+    return cv2.copyMakeBorder(np.hstack(glyphs), 20, 20, 15, 15, cv2.BORDER_CONSTANT, value=20)
+
+
+def test_glyph_classifier():
+    # Crops drawn from the atlas itself only check that numbers are split and read back in order,
+    # accuracy on real crops is test_glyph_classifier_held_out_screenshots
+    classifier = GlyphClassifier.from_folder()
+    assert sorted(set(classifier.labels.tolist())) == list(range(10))
+    for number in ["0", "7", "11", "42", "1089", "56"]:
+        assert classifier.read(number_crop(number)) == number
+
+
+def test_glyph_classifier_held_out_screenshots():
+    # Each labelled screenshot is read by a classifier built from the glyphs of all the others,
+    # through the same crops as OCR.get_text, so none of its own digits are among the samples
+    glyphs = {image_name: labelled_glyphs(image_name) for image_name in labels}
+    checked = 0
+    for held_out, teams in labels.items():
+        samples = [sample for image_name in labels if image_name != held_out for sample in glyphs[image_name]]
+        classifier = GlyphClassifier(
+            normalize_rows(np.stack([glyph for glyph, _ in samples]).reshape(len(samples), -1)),
+            np.array([int(digit) for _, digit in samples]),
+        )
+        numbers_images = number_crops(scoreboard_gray(cv2.imread(f"{get_project_root()}/tests/data/{held_out}")))
+        for team, digits in zip(("blue", "red"), teams):
+            # When the crops miss a number the labels cannot be lined up, test15's blue team
+            if sum(len(segment_glyphs(number_image)) for number_image in numbers_images[team]) != len(digits):
+                continue
+            assert "".join(classifier.read(number_image) or "?" for number_image in numbers_images[team]) == digits
+            checked += 1
+    assert checked == 2 * len(labels) - 1
+
+
+def test_glyph_classifier_unsure():
+    classifier = GlyphClassifier.from_folder()
+    assert classifier.read(np.zeros((40, 30), np.uint8)) is None
+    # A filled block is no digit, it should go to the fallback instead of being forced into one
+    block = np.zeros((60, 50), np.uint8)
+    block[10:50, 10:40] = 255
+    assert classifier.read(block) is None
@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+from time import sleep
+
+import pytest
+
+from bot.ingestion.engine_pool import EnginePool
+
+
+class FakeEngine:
+    running = 0
+    max_running = 0
+    lock = Lock()
+
+    def __init__(self):
+        self.inputs = []
+
+    def __call__(self, image):
+        with self.lock:
+            FakeEngine.running += 1
+            FakeEngine.max_running = max(FakeEngine.max_running, FakeEngine.running)
+        sleep(0.01)
+        self.inputs.append(image)
+        with self.lock:
+            FakeEngine.running -= 1
+        return image * 2
+
+
+def test_engine_pool_warm_up():
+    engines = []
+    pool = EnginePool(lambda: engines.append(FakeEngine()) or engines[-1], size=3, warm_up_input=0)
+    pool.warm_up()
+    assert len(engines) == 3
+    assert [engine.inputs for engine in engines] == [[0], [0], [0]]
+    # Warm-up runs are not counted
+    assert sum(stats.calls for stats in pool.stats) == 0
+
+
+def test_engine_pool_concurrency_and_stats():
+    pool = EnginePool(FakeEngine, size=2)
+    with ThreadPoolExecutor(6) as executor:
+        results = list(executor.map(pool, range(12)))
+    assert results == [value * 2 for value in range(12)]
+    assert len(pool.stats) == 2
+    assert FakeEngine.max_running <= 2
+    report = pool.report()
+    assert sum(engine["calls"] for engine in report) == 12
+    assert all(engine["mean_inference_ms"] >= 10 for engine in report)
+    # Six callers on two engines, some of them had to queue
+    assert max(engine["max_wait_ms"] for engine in report) > 0
+
+
+def test_engine_pool_failing_factory():
+    attempts = []
+
+    def factory():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise RuntimeError("model file missing")
+        return FakeEngine()
+
+    pool = EnginePool(factory, size=1)
+    with pytest.raises(RuntimeError):
+        pool(1)
+    # The failed engine took no slot, the next caller creates one instead of waiting for it forever
+    results = []
+    caller = Thread(target=lambda: results.append(pool(1)), daemon=True)
+    caller.start()
+    caller.join(timeout=5)
+    assert results == [2]
+    assert len(pool.stats) == 1
+
+
+def test_ocr_engines_get_thread_settings(monkeypatch):
+    # The OCR packages are optional, the pool itself is tested without them
+    pytest.importorskip("pytesseract")
+    pytest.importorskip("rapidocr_onnxruntime")
+    stats = pytest.importorskip("bot.ingestion.stats")
+    # RapidOCR ignores thread counts above the CPU count, one is valid everywhere
+    monkeypatch.setattr(stats, "ocr_intra_op_threads", 1)
+    monkeypatch.setattr(stats, "ocr_inter_op_threads", 1)
+    stats.get_engine_pool.cache_clear()
+    try:
+        engine = stats.get_engine_pool().factory()
+    finally:
+        stats.get_engine_pool.cache_clear()
+    for session in (engine.text_det.infer, engine.text_cls.infer, engine.text_rec.session):
+        options = session.session.get_session_options()
+        assert (options.intra_op_num_threads, options.inter_op_num_threads) == (1, 1)
@@ -0,0 +1,54 @@
+from asyncio import gather, get_running_loop
+
+import cv2
+import pytest
+
+from bot import get_project_root
+from bot.exceptions import RecognitionQueueFull
+from bot.ingestion.executor import RecognitionExecutor
+from tests.ingestion.test_champions import correct_guesses
+
+
+@pytest.mark.asyncio
+async def test_recognition_executor():
+    executor = RecognitionExecutor(workers=1, max_queue=1)
+    with open(f"{get_project_root()}/tests/data/test1.png", "rb") as file:
+        image_bytes = file.read()
+    try:
+        results = await gather(executor.recognize(image_bytes), executor.recognize(image_bytes), return_exceptions=True)
+    finally:
+        executor.shutdown()
+    champions, bans, portraits, image = results[0]
+    assert (champions, bans) == (correct_guesses[0], ([], []))
+    assert len(portraits) == len(correct_guesses[0])
+    # Decoded once, in the worker, and sent back as uploaded: no ROIs drawn on it
+    assert (image == cv2.imread(f"{get_project_root()}/tests/data/test1.png")).all()
+    assert isinstance(results[1], RecognitionQueueFull)
+
+
+@pytest.mark.asyncio
+async def test_recognition_executor_warm_up():
+    executor = RecognitionExecutor(workers=1)
+    try:
+        await executor.warm_up()
+        assert await get_running_loop().run_in_executor(executor.pool, executor.worker.ready)
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_recognition_executor_recovers_from_a_dead_worker():
+    executor = RecognitionExecutor(workers=1)
+    with open(f"{get_project_root()}/tests/data/test1.png", "rb") as file:
+        image_bytes = file.read()
+    try:
+        await executor.warm_up()
+        broken_pool = executor.pool
+        for process in list(broken_pool._processes.values()):
+            process.kill()
+            process.join()
+        champions, bans, *_ = await executor.recognize(image_bytes)
+        assert executor.pool is not broken_pool
+    finally:
+        executor.shutdown()
+    assert (champions, bans) == (correct_guesses[0], ([], []))
@@ -0,0 +1,78 @@
+from asyncio import CancelledError, sleep
+
+import pytest
+
+from bot.exceptions import GeminiError
+from bot.ingestion.hedging import HedgedRequest, HedgePolicy
+
+
+class FakeModel:
+    # Answers after `latency` seconds, or raises `error`, and remembers whether it was cancelled
+    def __init__(self, answer=None, latency: float = 0.0, error: Exception | None = None):
+        self.answer = answer
+        self.latency = latency
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await sleep(self.latency)
+        except CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return self.answer
+
+
+def hedged(primary: FakeModel, secondary: FakeModel, delay: float = 0.05) -> HedgedRequest:
+    return HedgedRequest(primary, secondary, lambda answer: answer != "garbage", HedgePolicy(initial_delay=delay))
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    primary, secondary = FakeModel("pro", 0.01), FakeModel("flash")
+    assert await hedged(primary, secondary)() == "pro"
+    assert secondary.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_cancelled():
+    primary, secondary = FakeModel("pro", 1.0), FakeModel("flash", 0.01)
+    assert await hedged(primary, secondary)() == "flash"
+    # The cancellation is delivered on the loser's next step
+    await sleep(0)
+    assert primary.cancelled
+
+
+@pytest.mark.asyncio
+async def test_cancelled_primary_latency_is_recorded():
+    primary, secondary = FakeModel("pro", 1.0), FakeModel("flash", 0.05)
+    request = hedged(primary, secondary)
+    assert await request() == "flash"
+    # At least the hedge delay and the secondary's answer, a lower bound of the primary's latency
+    assert len(request.policy.latencies) == 1
+    assert 0.1 <= request.policy.latencies[0] < 1.0
+
+
+@pytest.mark.asyncio
+async def test_failed_or_invalid_primary_hedges_at_once():
+    for primary in (FakeModel(error=RuntimeError()), FakeModel("garbage")):
+        secondary = FakeModel("flash")
+        assert await hedged(primary, secondary, delay=10)() == "flash"
+
+
+@pytest.mark.asyncio
+async def test_no_valid_answer():
+    with pytest.raises(GeminiError):
+        await hedged(FakeModel("garbage"), FakeModel(error=RuntimeError()))()
+
+
+def test_policy_delay():
+    policy = HedgePolicy(percentile=0.5, initial_delay=30, min_samples=3)
+    assert policy.delay == 30
+    for latency in (1.0, 2.0, 9.0):
+        policy.record(latency)
+    assert policy.delay == 2.0
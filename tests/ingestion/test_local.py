@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+# The match models need the bot's full dependencies
+pytest.importorskip("beanie")
+pytest.importorskip("discord")
+
+from api.models.match import Match  # noqa: E402
+from bot.ingestion.local import extract_match, match_problems  # noqa: E402
+
+
+@pytest.fixture
+def stats():
+    # Local OCR and its packages are optional, the consistency checks are tested without them
+    pytest.importorskip("pytesseract")
+    pytest.importorskip("rapidocr_onnxruntime")
+    return pytest.importorskip("bot.ingestion.stats")
+
+
+def team(kills: list[int], deaths: list[int], gold: list[int], totals: dict | None = None) -> dict:
+    players = [
+        {
+            "name": f"player{index}",
+            "discord_id": None,
+            "stats": {
+                "kills": kills[index],
+                "deaths": deaths[index],
+                "assists": 0,
+                "minions_killed": 100,
+                "gold_earned": gold[index],
+                "level": 15,
+            },
+        }
+        for index in range(5)
+    ]
+    stats = {
+        "kills": sum(kills),
+        "deaths": sum(deaths),
+        "assists": 0,
+        "total_gold": sum(gold),
+        "towers_destroyed": 3,
+        "inhibitors_destroyed": 0,
+        "barons_slain": 0,
+        "dragons_slain": 1,
+        "rift_heralds_slain": 0,
+        "void_grubs_slain": 3,
+    }
+    return {"players": players, "stats": stats | (totals or {})}
+
+
+def match(blue: dict, red: dict) -> Match:
+    return Match(blue_team=blue, red_team=red, duration="25:13", date=datetime(2024, 10, 1), winner="blue")
+
+
+def test_consistent_match():
+    blue = team([3, 2, 1, 0, 4], [1, 1, 1, 1, 1], [9000, 8000, 7000, 6000, 10000])
+    red = team([1, 1, 1, 1, 0], [2, 2, 2, 2, 2], [7000, 7000, 7000, 7000, 6000])
+    assert match_problems(match(blue, red)) == []
+
+
+def test_inconsistent_match():
+    # A misread player kill, a misread team gold and more kills than the other team has deaths
+    blue = team([3, 2, 1, 0, 4], [1, 1, 1, 1, 1], [9000, 8000, 7000, 6000, 10000], {"kills": 11, "total_gold": 41000})
+    red = team([1, 1, 1, 1, 0], [2, 2, 2, 2, 2], [7000, 7000, 7000, 7000, 6000])
+    problems = match_problems(match(blue, red))
+    assert len(problems) == 3
+    assert problems[0] == "blue team kills 11 != 10 from its players"
+
+
+def test_extraction_failure(monkeypatch, stats):
+    class BrokenOCR:
+        def __init__(self, image):
+            pass
+
+        def create_match(self, summoner_name):
+            raise RuntimeError("tesseract is not installed")
+
+    monkeypatch.setattr(stats, "OCR", BrokenOCR)
+    match, problems = extract_match(np.zeros((10, 10, 3), np.uint8), "Sinj")
+    assert match is None
+    assert problems == ["could not parse the scoreboard: tesseract is not installed"]
+
+
+def test_missing_team_gold(monkeypatch, stats):
+    # The gold after the blue team's KDA was not read
+    text = ["Custom", "25:13", "10/1/2024", "TEAM 1", "10/5/3", "X", "Lvl"]
+    monkeypatch.setattr(stats.OCR, "get_text", lambda self: (text, [], []))
+    match, problems = extract_match(np.zeros((10, 10, 3), np.uint8), "Sinj")
+    assert match is None
+    assert problems == ["could not parse the scoreboard: blue team gold not found after its KDA"]
@@ -0,0 +1,31 @@
+import subprocess
+import sys
+
+import pytest
+
+from bot import get_project_root
+from bot.startup import import_timed, startup_report, timings
+
+
+def test_import_timed():
+    module = import_timed("bot.ingestion.digits")
+    assert module.__name__ == "bot.ingestion.digits"
+    # Already loaded modules cost nothing and are not recorded again
+    timings.pop("import bot.ingestion.digits", None)
+    import_timed("bot.ingestion.digits")
+    assert "import bot.ingestion.digits" not in timings
+    assert startup_report().startswith("Started in ")
+
+
+def test_upload_command_is_lazy():
+    pytest.importorskip("beanie")
+    pytest.importorskip("discord")
+    heavy = ["cv2", "numpy", "PIL.Image", "google.generativeai", "bot.ingestion.gemini"]
+    loaded = subprocess.run(
+        [sys.executable, "-c", f"import sys, bot.commands.match; print([m for m in {heavy} if m in sys.modules])"],
+        cwd=get_project_root(),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+    assert loaded == "[]"
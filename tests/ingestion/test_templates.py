@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+from os import listdir, makedirs, utime
+
+import cv2
+import numpy as np
+
+from bot import get_project_root
+from bot.ingestion import templates
+from bot.ingestion.templates import TemplateBank, build_atlas, load_atlas
+
+
+def test_template_bank_grayscale_and_lru():
+    images = {"Ahri": np.zeros((120, 120, 3), np.uint8), "Ashe": np.full((120, 120, 3), 255, np.uint8)}
+    bank = TemplateBank.from_images(images, max_sizes=2)
+    assert bank.templates["Ahri"].shape == (120, 120)
+
+    first = bank.resized(50, 40)
+    assert first["Ashe"].shape == (40, 50)
+    assert bank.resized(50, 40) is first
+
+    bank.resized(60, 60)
+    bank.resized(50, 40)
+    bank.resized(70, 70)
+    # (60, 60) was the least recently used size, so it is the one evicted
+    assert list(bank._resized) == [(50, 40), (70, 70)]
+
+
+def test_template_bank_from_atlas():
+    bank = TemplateBank.from_atlas("champions2")
+    assert len(bank) == len(listdir(f"{get_project_root()}/bot/ingestion/champions2"))
+    assert isinstance(next(iter(bank.templates.values())), np.memmap)
+    assert bank.templates["Ahri"].dtype == np.uint8
+
+
+def use_template_folder(tmp_path, monkeypatch) -> str:
+    folder = f"{tmp_path}/bot/ingestion/icons"
+    makedirs(folder)
+    for value, name in enumerate(["Ahri", "Ashe", "Zed"]):
+        cv2.imwrite(f"{folder}/{name}.png", np.full((8, 8, 3), value, np.uint8))
+    monkeypatch.setattr(templates, "get_project_root", lambda: str(tmp_path))
+    monkeypatch.setattr(templates, "atlas_folder", f"{tmp_path}/atlas")
+    return folder
+
+
+def test_atlas_rebuilt_when_a_template_changes(tmp_path, monkeypatch):
+    folder = use_template_folder(tmp_path, monkeypatch)
+    names, images = load_atlas("icons")
+    assert names == ["Ahri", "Ashe", "Zed"] and images[2, 0, 0] == 2
+
+    # Same names, edited content
+    cv2.imwrite(f"{folder}/Zed.png", np.full((8, 8, 3), 9, np.uint8))
+    utime(f"{folder}/Zed.png", ns=(0, 0))
+    names, images = load_atlas("icons")
+    assert names == ["Ahri", "Ashe", "Zed"] and images[2, 0, 0] == 9
+
+
+def test_atlas_built_concurrently(tmp_path, monkeypatch):
+    use_template_folder(tmp_path, monkeypatch)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: build_atlas("icons"), range(16)))
+    assert sorted(listdir(f"{tmp_path}/atlas")) == ["icons.json", "icons.npy"]
+    assert load_atlas("icons")[1].shape == (3, 8, 8)
+
+
+def test_template_bank_shortlist():
+    bank = TemplateBank.from_atlas("champions2")
+    shortlist = bank.shortlist(np.asarray(bank.templates["Ahri"]), 5)
+    assert len(shortlist) == 5
+    assert bank.names[shortlist[0]] == "Ahri"
@@ -0,0 +1,36 @@
+import cv2
+import numpy as np
+
+from bot import get_project_root
+from bot.ingestion.text_lines import find_text_segments, group_lines, pack_text_lines
+
+
+def scoreboard_row() -> np.ndarray:
+    # Light text on a dark background, with a textured icon between the words, like a player row
+    image = np.full((120, 600), 20, np.uint8)
+    cv2.putText(image, "Custom 25:38", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, 230, 1)
+    cv2.putText(image, "15", (10, 85), cv2.FONT_HERSHEY_SIMPLEX, 0.5, 230, 1)
+    cv2.putText(image, "3/4/7", (400, 85), cv2.FONT_HERSHEY_SIMPLEX, 0.5, 230, 1)
+    rng = np.random.default_rng(0)
+    image[60:100, 150:190] = rng.integers(40, 255, (40, 40), dtype=np.uint8)
+    return image
+
+
+def test_find_text_segments():
+    glyph, segments = find_text_segments(scoreboard_row())
+    assert glyph > 0
+    lines = group_lines(segments)
+    # The icon is left out, and the words come back in reading order
+    assert len(lines) == 2
+    assert len(lines[0]) == 1
+    assert [segment[0] < 100 for segment in lines[1]] == [True, False]
+    assert not any(segment[0] < 190 and segment[2] > 150 for segment in segments)
+
+
+def test_pack_text_lines():
+    screenshot = cv2.imread(f"{get_project_root()}/tests/data/test10.png", cv2.IMREAD_GRAYSCALE)
+    left = screenshot[:, : int(screenshot.shape[1] * 0.75)]
+    packed = pack_text_lines(left)
+    assert packed.dtype == np.uint8
+    # Text only, icons and the empty columns between them left out
+    assert packed.size < left.size * 0.7
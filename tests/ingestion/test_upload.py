@@ -0,0 +1,29 @@
+import cv2
+import numpy as np
+import pytest
+
+from bot import get_project_root
+from bot.ingestion.upload import crop_scoreboard, prepare_upload
+
+# Portrait ROIs of tests/data/test10.png, one per player row
+portraits = [(134, 336 + 44 * index + index // 2, 40, 40) for index in range(10)]
+
+
+def test_crop_scoreboard():
+    image = np.zeros((898, 1316, 3), np.uint8)
+    cropped = crop_scoreboard(image, portraits)
+    # From the title above the first row to just under the last one, full width
+    assert cropped.shape == ((736 + 60) - (336 - 230), 1316, 3)
+    assert crop_scoreboard(image, []) is image
+
+
+@pytest.mark.parametrize("image_format", ["webp", "jpeg"])
+def test_prepare_upload(image_format):
+    screenshot = cv2.imread(f"{get_project_root()}/tests/data/test10.png")
+    prepared = prepare_upload(screenshot, portraits, max_pixels=500_000, image_format=image_format, quality=80)
+    assert prepared.mime_type == f"image/{image_format}"
+    assert prepared.width * prepared.height <= 500_000
+    assert prepared.source_pixels == screenshot.shape[0] * screenshot.shape[1]
+    decoded = cv2.imdecode(np.frombuffer(prepared.data, np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == (prepared.height, prepared.width, 3)
+    assert len(prepared.data) < len(cv2.imencode(".png", screenshot)[1]) / 4
@@ -0,0 +1,172 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from bot import helpers
+from bot.balancing import pareto_front, partition, score_gaps, solve, split_terms, team_splits
+from bot.exceptions import InvalidWeights
+from bot.helpers import BalanceContext, BalanceWeights
+
+
+def test_team_splits():
+    masks = team_splits()
+    assert masks.shape == (126, 10)
+    assert (masks.sum(axis=1) == 5).all()
+    # No split appears twice, not even with the teams swapped
+    assert len({mask.tobytes() for mask in np.concatenate([masks, ~masks])}) == 252
+
+
+def test_solve_finds_the_smallest_gap():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        scores = rng.integers(0, 220, 10).astype(float)
+        best = min(abs(2 * sum(scores[index] for index in team) - scores.sum()) for team in combinations(range(10), 5))
+        blue, red, gap = solve(scores, rng=rng)
+        assert sorted(blue + red) == list(range(10))
+        assert gap == best == abs(scores[blue].sum() - scores[red].sum())
+
+
+def test_solve_varies_within_the_tolerance():
+    scores = np.array([100, 100, 100, 100, 100, 90, 90, 90, 90, 90], dtype=float)
+    rng = np.random.default_rng(0)
+    teams = {tuple(solve(scores, tolerance=20, rng=rng)[0]) for _ in range(50)}
+    assert len(teams) > 10
+    # Without a tolerance only the closest splits are drawn
+    assert {solve(scores, rng=rng)[2] for _ in range(20)} == {score_gaps(scores).min()}
+
+
+def test_split_terms():
+    scores = np.full(10, 100.0)
+    main_roles = ["top", "top", "mid", "mid", "jungle", "jungle", "bottom", "bottom", "support", None]
+    last_teams = [0, 0, 0, 0, 0, 1, 1, 1, 1, None]
+    costs = split_terms(scores, 0, main_roles, [0.5] * 10, last_teams)
+    assert costs.shape == (126, 4)
+    assert not costs[:, [0, 2]].any()
+    # Both top players together in the first team and nothing else doubled
+    top_together = np.flatnonzero((team_splits()[:, :2].all(axis=1)) & (costs[:, 1] == 1))
+    assert len(top_together)
+    # Last game's teams again: 10 pairs in the first team, 6 in the second
+    last_game = np.flatnonzero((team_splits()[:, :5]).all(axis=1))
+    assert costs[last_game, 3].tolist() == [16]
+
+
+def test_pareto_front():
+    costs = np.array([[1, 2], [2, 1], [2, 2], [1, 2], [3, 0]], dtype=float)
+    assert pareto_front(costs).tolist() == [0, 1, 3, 4]
+
+
+def test_solve_weighs_every_term():
+    scores = np.array([120, 100, 110, 100, 90, 100, 130, 100, 80, 100], dtype=float)
+    main_roles = ["top", "top", "jungle", "jungle", "mid", "mid", "bottom", "bottom", "support", "support"]
+    win_rates = [0.6, 0.4, 0.5, 0.7, 0.3, 0.5, 0.5, 0.6, 0.4, 0.5]
+    last_teams = [0, 1, 0, 1, 0, 1, 0, 1, 0, None]
+    weights = {"rank": 1, "roles": 10, "win_rate": 50, "repeats": 2}
+    costs = split_terms(scores, 5, main_roles, win_rates, last_teams)
+    best = (costs @ np.array(list(weights.values()))).min()
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        blue, red, gap = solve(scores, 5, rng, weights, main_roles, win_rates, last_teams)
+        assert len({main_roles[index] for index in blue}) == len({main_roles[index] for index in red}) == 5
+        split = np.flatnonzero((team_splits() == np.isin(np.arange(10), blue if 0 in blue else red)).all(axis=1))
+        assert costs[split] @ np.array(list(weights.values())) == pytest.approx([best])
+        assert gap == score_gaps(scores)[split][0]
+
+
+def test_partition():
+    rng = np.random.default_rng(0)
+    scores = rng.choice([30, 55, 80, 105, 140, 170, 220], 100).astype(float)
+    main_roles = list(rng.choice(["top", "jungle", "mid", "bottom", "support", None], 100))
+    win_rates = list(rng.uniform(0.3, 0.7, 100))
+    weights = {"rank": 1, "roles": 10, "win_rate": 50, "repeats": 2}
+    weight = np.array(list(weights.values()))
+
+    def total_cost(lobbies: list[tuple[list[int], list[int], float]]) -> float:
+        return sum(
+            (
+                split_terms(
+                    scores[first + second],
+                    5,
+                    [main_roles[index] for index in first + second],
+                    [win_rates[index] for index in first + second],
+                )
+                @ weight
+            ).min()
+            for first, second, _ in lobbies
+        )
+
+    lobbies = partition(scores, 5, rng, weights, main_roles, win_rates)
+    assert len(lobbies) == 10
+    assert sorted(index for first, second, _ in lobbies for index in first + second) == list(range(100))
+    assert all(len(first) == len(second) == 5 for first, second, _ in lobbies)
+    # The swaps improve on the snake draft alone
+    assert total_cost(lobbies) < total_cost(partition(scores, 5, rng, weights, main_roles, win_rates, max_swaps=0))
+
+    # Ten players are a single lobby, split as solve would
+    first, second, gap = partition(scores[:10], rng=rng)[0]
+    assert gap == score_gaps(scores[:10]).min()
+    with pytest.raises(ValueError):
+        partition(scores[:15])
+
+
+def test_balance_weights():
+    weights = BalanceWeights.parse("rank=1 roles=10 win_rate=50 repeats=2")
+    assert str(weights) == "rank=1 roles=10 win_rate=50 repeats=2"
+    assert BalanceWeights.parse("roles=0", weights) == BalanceWeights(1, 0, 50, 2)
+    for text in ("ranks=1", "rank", "rank=-1", "rank=high", "rank=nan", "rank=inf"):
+        with pytest.raises(InvalidWeights):
+            BalanceWeights.parse(text)
+
+
+@pytest.mark.asyncio
+async def test_balance(monkeypatch):
+    ranks = ["Challenger 1", "Master 1", "Diamond 1", "Emerald 2", "Platinum 4"] * 2
+    summoners = [(f"player{index}", "EUW") for index in range(10)]
+
+    async def get_rank(summoner: str, tag: str) -> tuple[str, str]:
+        return summoner, ranks[int(summoner.removeprefix("player"))]
+
+    monkeypatch.setattr(helpers, "get_rank_v3", get_rank)
+    [(blue_team, red_team)], mapped_results = await helpers.balance(summoners)
+    assert sorted(blue_team["players"] + red_team["players"]) == sorted(summoner for summoner, _ in summoners)
+    assert abs(blue_team["score"] - red_team["score"]) <= helpers.threshold
+    assert mapped_results["player0"] == "Challenger 1"
+
+
+@pytest.mark.asyncio
+async def test_balance_with_context(monkeypatch):
+    summoners = [(f"player{index}", "EUW") for index in range(10)]
+    main_roles = ["top", "jungle", "mid", "bottom", "support"] * 2
+
+    async def get_rank(summoner: str, tag: str) -> tuple[str, str]:
+        return summoner, "Gold 4"
+
+    monkeypatch.setattr(helpers, "get_rank_v3", get_rank)
+    context = BalanceContext(
+        {summoner: main_roles[index] for index, (summoner, _) in enumerate(summoners)},
+        {summoner: 0.5 for summoner, _ in summoners},
+        {summoner: index // 5 for index, (summoner, _) in enumerate(summoners)},
+    )
+    weights = BalanceWeights(1, 10, 50, 2)
+    [(blue_team, red_team)], _ = await helpers.balance(summoners, weights, context)
+    for team in (blue_team, red_team):
+        assert sorted(context.main_roles[player] for player in team["players"]) == sorted(main_roles[:5])
+        # Not the same five as last game
+        assert len({context.last_teams[player] for player in team["players"]}) == 2
+
+
+@pytest.mark.asyncio
+async def test_balance_many_lobbies(monkeypatch):
+    ranks = ["Challenger 1", "Master 1", "Diamond 1", "Emerald 2", "Platinum 4", "Gold 4", "Silver 2", "Bronze 1"]
+    summoners = [(f"player{index}", "EUW") for index in range(40)]
+
+    async def get_rank(summoner: str, tag: str) -> tuple[str, str]:
+        return summoner, ranks[int(summoner.removeprefix("player")) % len(ranks)]
+
+    monkeypatch.setattr(helpers, "get_rank_v3", get_rank)
+    lobbies, _ = await helpers.balance(summoners, BalanceWeights())
+    assert len(lobbies) == 4
+    assert sorted(player for lobby in lobbies for team in lobby for player in team["players"]) == sorted(
+        summoner for summoner, _ in summoners
+    )
+    assert all(abs(blue_team["score"] - red_team["score"]) <= helpers.threshold for blue_team, red_team in lobbies)